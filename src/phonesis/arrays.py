@@ -0,0 +1,148 @@
+from array import array
+from collections import namedtuple
+
+# NumPy is imported on the first use of the array output,
+# to keep it out of the import time of the package.
+np = None
+
+BatchArrays = namedtuple(
+    'BatchArrays', ['ids', 'attention_mask', 'lengths', 'indices']
+)
+BatchArrays.__doc__ = """
+Padded batch of token ids
+
+:ivar ids: The `int32` matrix of the token ids, one row per text
+:ivar attention_mask: The `int32` matrix with 1 on the token ids
+  and 0 on the padding
+:ivar lengths: The number of token ids of each row
+:ivar indices: The position of each row in the input texts
+"""
+
+TokenSpans = namedtuple('TokenSpans', ['ids', 'starts', 'ends'])
+TokenSpans.__doc__ = """
+Token ids of a text, with the character offsets of the tokens
+in the original text
+
+The buffers are `array('i')`, `numpy.frombuffer(spans.starts,
+dtype=numpy.int32)` gives a NumPy view without copy.
+
+:ivar ids: The token ids
+:ivar starts: The offset of the first character of each token
+:ivar ends: The offset after the last character of each token,
+  the word boundaries (`#`) are empty spans at the end of their word
+"""
+
+
+def _require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(
+                "NumPy is required for the array output,"
+                " install it with `pip install numpy`.") from None
+        np = numpy
+    return np
+
+
+class EncodedTexts:
+    """
+    Token ids of several texts, stored in one flat buffer
+
+    :arg model: The instance of Tokenizer model
+    :arg texts: The texts to encode
+    :arg boundaries: Keep the ids of the word boundaries (`#`)
+    :arg unk_id: The id written instead of the negative ids of the unknown
+      tokens, which are kept if it is not defined
+
+    :type model: phonesis.impl.Tokenizer
+    :type texts: typing.Iterable[str]
+    :type boundaries: `bool`
+    :type unk_id: `int`
+    """
+    def __init__(self, model, texts, boundaries=True, unk_id=None):
+        _require_numpy()
+        buffer = array('i')
+        lengths = array('q')
+        for text in texts:
+            ids = model.encode_ids(text)
+            buffer.extend(ids)
+            lengths.append(len(ids))
+
+        flat = np.frombuffer(buffer, dtype=np.int32) if buffer else \
+            np.zeros(0, dtype=np.int32)
+        if unk_id is not None and (flat < 0).any():
+            flat = np.where(flat < 0, np.int32(unk_id), flat)
+        lengths = np.frombuffer(lengths, dtype=np.int64) if lengths else \
+            np.zeros(0, dtype=np.int64)
+        if not boundaries:
+            boundary_id = model.token_to_id('#')
+            keep = flat != boundary_id
+            rows = np.repeat(np.arange(len(lengths)), lengths)
+            lengths = np.bincount(rows[keep], minlength=len(lengths))
+            flat = flat[keep]
+
+        self.flat = flat
+        self.lengths = lengths.astype(np.int64)
+        self.starts = np.concatenate(([0], np.cumsum(self.lengths)[:-1])) \
+            .astype(np.int64)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def pad(self, rows=None, max_length=None, pad_id=-1, truncation=True):
+        """
+        Method to build the padded id matrix of some rows
+
+        :arg rows: The indices of the texts, all texts if not defined
+        :arg max_length: The width of the matrix, the length of the
+          longest row if it is not defined
+        :arg pad_id: The id written on the padding
+        :arg truncation: Truncate the rows longer than `max_length`,
+          otherwise a `ValueError` is raised
+
+        :type rows: numpy.ndarray
+        :type max_length: `int`
+        :type pad_id: `int`
+        :type truncation: `bool`
+        :rtype: phonesis.arrays.BatchArrays
+        """
+        if rows is None:
+            rows = np.arange(len(self))
+        lengths = self.lengths[rows]
+        width = max_length
+        if width is None:
+            width = int(lengths.max()) if len(lengths) else 0
+        if not truncation and (lengths > width).any():
+            raise ValueError(
+                f"A text has more than {width} tokens"
+                " and the truncation is disabled.")
+        lengths = np.minimum(lengths, width)
+
+        columns = np.arange(width)
+        mask = columns[None, :] < lengths[:, None]
+        ids = np.full((len(rows), width), pad_id, dtype=np.int32)
+        positions = self.starts[rows][:, None] + columns[None, :]
+        ids[mask] = self.flat[positions[mask]]
+        return BatchArrays(ids, mask.astype(np.int32), lengths, rows)
+
+    def buckets(self, batch_size, max_length=None, pad_id=-1,
+                truncation=True):
+        """
+        Method to group the texts of similar lengths into padded batches
+
+        The texts are sorted by length, so each batch is padded to
+        the length of its own longest row.
+
+        :type batch_size: `int`
+        :type max_length: `int`
+        :type pad_id: `int`
+        :type truncation: `bool`
+        :rtype: `list` of phonesis.arrays.BatchArrays
+        """
+        order = np.argsort(self.lengths, kind='stable')
+        return [
+            self.pad(order[i:i + batch_size], max_length, pad_id, truncation)
+            for i in range(0, len(order), batch_size)
+        ]
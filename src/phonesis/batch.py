@@ -0,0 +1,117 @@
+import os
+import itertools
+# The process pool module is loaded by `concurrent.futures` on first use.
+import concurrent.futures
+
+_worker_model = None
+
+
+def _init_worker(model):
+    """
+    Function run once in each worker process to keep its own
+    copy of the tokenizer model
+    """
+    global _worker_model
+    _worker_model = model
+
+
+def _encode_chunk(texts):
+    return [_worker_model.encode(text) for text in texts]
+
+
+def _encode_ids_chunk(texts):
+    return [_worker_model.encode_ids(text) for text in texts]
+
+
+def split_chunks(items, chunk_size):
+    """
+    Function to split a sequence into consecutive chunks
+
+    :type items: typing.Iterable
+    :type chunk_size: `int`
+    :rtype: typing.Generator[list]
+    """
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+class BatchEncoder:
+    """
+    Encoder which spreads the texts over a pool of processes
+
+    The tokenizer model is sent once to each worker when it starts,
+    then only the texts and the results go through the pool.
+    A batch which fits in one chunk is encoded in the current process,
+    since the pool overhead would be greater than the gain.
+
+    :arg model: The instance of Tokenizer model
+    :arg workers: The number of worker processes, the number of CPUs
+      if it is not defined
+    :arg chunk_size: The number of texts sent to a worker at once
+
+    :type model: phonesis.impl.Tokenizer
+    :type workers: `int`
+    :type chunk_size: `int`
+    """
+    def __init__(self, model, workers=None, chunk_size=256):
+        assert chunk_size > 0, "The chunk size must be positive."
+        self.model = model
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self._executor = None
+
+    def _get_executor(self):
+        if not self._executor:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.model,),
+            )
+        return self._executor
+
+    def encode(self, texts):
+        """
+        Method to encode a batch of texts, the order of the inputs is kept
+
+        :type texts: typing.Sequence[str]
+        :rtype: `list` of `tuple`
+        """
+        if self.workers <= 1 or len(texts) <= self.chunk_size:
+            return self.model.forward(texts)
+
+        executor = self._get_executor()
+        chunks = split_chunks(texts, self.chunk_size)
+        out = []
+        for results in executor.map(_encode_chunk, chunks):
+            out.extend(results)
+        return out
+
+    def encode_ids(self, texts):
+        """
+        Method to encode a batch of texts into arrays of ids only,
+        the order of the inputs is kept
+
+        :type texts: typing.Sequence[str]
+        :rtype: `list` of array.array
+        """
+        if self.workers <= 1 or len(texts) <= self.chunk_size:
+            return [self.model.encode_ids(text) for text in texts]
+
+        executor = self._get_executor()
+        chunks = split_chunks(texts, self.chunk_size)
+        out = []
+        for results in executor.map(_encode_ids_chunk, chunks):
+            out.extend(results)
+        return out
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded cache which evicts the least recently used entry
+    when it is full
+
+    :arg capacity: The maximum number of entries kept in the cache
+
+    :type capacity: `int`
+    """
+    def __init__(self, capacity):
+        assert capacity > 0, "The capacity of the cache must be positive."
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key):
+        """
+        Method to get the value of a key and mark it as recently used
+
+        :rtype: The value, or None when the key is not in the cache
+        """
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _evict(self):
+        data = self._data
+        while len(data) > self.capacity:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key, value):
+        """
+        Method to add an entry, evicting the least recently used
+        entries if the capacity is exceeded
+        """
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self._evict()
+
+    def resize(self, capacity):
+        """
+        Method to change the capacity of the cache
+
+        :type capacity: `int`
+        """
+        assert capacity > 0, "The capacity of the cache must be positive."
+        self.capacity = capacity
+        self._evict()
+
+    def clear(self):
+        """
+        Method to remove all entries, the statistics are kept
+        """
+        self._data.clear()
+
+    def stats(self):
+        """
+        Method to get a snapshot of the cache statistics
+
+        :rtype: `dict`
+        """
+        lookups = self.hits + self.misses
+        return dict(
+            capacity=self.capacity,
+            size=len(self._data),
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            hit_rate=self.hits / lookups if lookups else 0.0,
+        )
@@ -1,5 +1,121 @@
 import os
+import sys
 import json
+import mmap
+import zlib
+import struct
+from array import array
+from collections.abc import Sequence
+
+DELTA_SUFFIX = '.delta'
+
+
+def append_delta(file_path, tokens):
+    """
+    Function to append new tokens to the delta journal of a codex,
+    without rewriting the codex
+
+    The journal `<file_path>.delta` contains one JSON list of tokens
+    per update. Its tokens are appended to the vocab of the codex, in
+    order, when the codex is loaded.
+
+    :type file_path: `str`
+    :type tokens: `list` of `str`
+    """
+    if not tokens:
+        return
+    with open(file_path + DELTA_SUFFIX, mode='a', encoding='utf-8') as f:
+        f.write(json.dumps(list(tokens), ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_delta(file_path):
+    """
+    Function to read the tokens of the delta journal of a codex
+
+    An incomplete last update, interrupted while it was written,
+    is ignored.
+
+    :type file_path: `str`
+    :rtype: `list` of `str`
+    """
+    delta_path = file_path + DELTA_SUFFIX
+    tokens = []
+    if not os.path.isfile(delta_path):
+        return tokens
+    with open(delta_path, mode='r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            tokens.extend(json.loads(line))
+    return tokens
+
+
+def remove_delta(file_path):
+    """
+    Function to remove the delta journal of a codex
+    """
+    delta_path = file_path + DELTA_SUFFIX
+    if os.path.isfile(delta_path):
+        os.remove(delta_path)
+
+
+def save_remap(file_path, remap, old_vocab, new_vocab):
+    """
+    Function to save the remap table of a compacted codex: the ids,
+    in the new vocab, of each token of the old vocab
+
+    A token pruned from the vocab is mapped to the ids of its
+    decomposition, -1 for a letter which is not in the new vocab.
+
+    :type file_path: `str`
+    :type remap: `list` of `list` of `int`
+    :type old_vocab: `list` of `str`
+    :type new_vocab: `list` of `str`
+    """
+    data = dict(old_size=len(old_vocab), new_size=len(new_vocab),
+                remap=remap)
+    with open(file_path, mode='w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def read_remap(file_path):
+    """
+    Function to read the remap table saved by `save_remap()`
+
+    :rtype: `list` of `list` of `int`
+    """
+    with open(file_path, mode='r', encoding='utf-8') as f:
+        return json.load(f)['remap']
+
+
+def write_json_codex(file_path, consonants, vowels, tokens):
+    """
+    Function to write a JSON codex, the tokens being written one by one
+    as they are produced, so the vocab is never held in memory
+
+    The file is the same as the one of `json.dumps(codex, indent=2)`.
+
+    :type file_path: `str`
+    :type consonants: `list` of `str`
+    :type vowels: `list` of `str`
+    :type tokens: typing.Iterable[str]
+    :returns: The number of tokens written
+    :rtype: `int`
+    """
+    data = dict(consonants=list(consonants or []),
+                vowels=list(vowels or []), vocab=[])
+    # The header ends with the empty vocab list and the closing brace.
+    header = json.dumps(data, indent=2)[:-len('[]\n}')]
+    n_tokens = 0
+    with open(file_path, mode='w', encoding='utf-8') as f:
+        f.write(header + '[')
+        for token in tokens:
+            f.write((',\n    ' if n_tokens else '\n    ') + json.dumps(token))
+            n_tokens += 1
+        f.write('\n  ]\n}' if n_tokens else ']\n}')
+    return n_tokens
 
 
 class FileHandler:
@@ -21,19 +137,25 @@ class FileHandler:
         """
         Method to save data of Tokenizer instance into file_path
         """
-        with open(self.file_path, mode='w', encoding='utf-8') as f:
-            consonants = []
-            vowels = []
-            vocab = []
-            if self.model.consonants:
-                consonants = self.model.consonants
-            if self.model.vowels:
-                vowels = self.model.vowels
-            if self.model.vocab:
-                vocab = self.model.vocab
-            data = dict(consonants=consonants, vowels=vowels, vocab=vocab)
-            jsonify = json.dumps(data, indent=2)
-            f.write(jsonify)
+        write_json_codex(self.file_path, self.model.consonants,
+                         self.model.vowels, self.model.vocab or [])
+        # The codex saved contains the whole vocab.
+        remove_delta(self.file_path)
+
+    def _apply_delta(self):
+        """
+        Method to append the tokens of the delta journal to the vocab
+        """
+        tokens = read_delta(self.file_path)
+        if not tokens:
+            return
+        vocab = self.model.vocab
+        if isinstance(vocab, MappedVocab):
+            # The codex stays mapped, with the new tokens after it.
+            vocab.extend(tokens)
+            self.model.vocab = vocab
+        else:
+            self.model.vocab = list(vocab or []) + tokens
 
     def load(self):
         """
@@ -49,4 +171,299 @@ class FileHandler:
             self.model.consonants = data['consonants']
             self.model.vowels = data['vowels']
             self.model.vocab = data['vocab']
-            return self.model
+        self._apply_delta()
+        return self.model
+
+
+CODEX_MAGIC = b'PHSX'
+CODEX_VERSION = 1
+BINARY_EXTENSION = '.phsx'
+# magic, version, flags, number of consonants, number of vowels,
+# number of tokens, number of slots of the lookup index, CRC32 of the payload
+CODEX_HEADER = struct.Struct('<4sHHIIIII')
+
+
+def _token_hash(data):
+    return zlib.crc32(data)
+
+
+def _as_uint32(view):
+    """
+    Function to read a little-endian buffer as unsigned 32 bits integers
+
+    :type view: `memoryview`
+    :rtype: `memoryview`|array.array
+    """
+    if sys.byteorder == 'little':
+        return view.cast('I')
+    values = array('I')
+    values.frombytes(view)
+    values.byteswap()
+    return values
+
+
+class MappedVocab(Sequence):
+    """
+    Vocab read from a memory-mapped binary codex
+
+    The tokens are decoded from the string table when they are accessed,
+    and the ids are found with the hash index stored in the codex.
+    Like a `dict`, it provides `get()` to find the id of a token.
+
+    A lookup in the hash index encodes the token and compares it with the
+    bytes of the string table, which is slower than a `dict`. So the ids
+    found are cached in a `dict`: its size grows with the number of
+    distinct tokens looked up, not with the vocab size.
+
+    The tokens of a delta journal are appended with `extend()`, after
+    the tokens of the codex, which stays mapped.
+
+    :arg buffer: The memory map of the codex file
+    :arg offsets: The offsets of the tokens in the string table
+    :arg slots: The slots of the hash index
+    :arg strings: The string table
+    :arg first: The index of the first token in `offsets`
+    :arg size: The number of tokens
+    """
+    def __init__(self, buffer, offsets, slots, strings, first, size):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._slots = slots
+        self._strings = strings
+        self._first = first
+        self._size = size
+        self._mask = len(slots) - 1
+        self._ids = {}
+        self._extra = []
+
+    def _encoded(self, index):
+        pos = self._first + index
+        return self._strings[self._offsets[pos]:self._offsets[pos + 1]]
+
+    def __len__(self):
+        return self._size + len(self._extra)
+
+    def __getitem__(self, index):
+        size = len(self)
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(size))]
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("Token index out of range.")
+        if index >= self._size:
+            return self._extra[index - self._size]
+        return str(self._encoded(index), 'utf-8')
+
+    def extend(self, tokens):
+        """
+        Method to append tokens after the tokens of the codex
+
+        The ids of the appended tokens are kept in the cache of the ids
+        found, a token already in the vocab keeps its first id.
+
+        :type tokens: typing.Iterable[str]
+        """
+        for token in tokens:
+            if self.get(token) is None:
+                self._ids[token] = len(self)
+            self._extra.append(token)
+
+    def get(self, token, default=None):
+        """
+        Method to get the id of a token
+
+        :type token: `str`
+        :rtype: `int`
+        """
+        index = self._ids.get(token)
+        if index is not None:
+            return index
+        data = token.encode('utf-8')
+        slots = self._slots
+        mask = self._mask
+        pos = _token_hash(data) & mask
+        while True:
+            slot = slots[pos]
+            if not slot:
+                return default
+            if self._encoded(slot - 1) == data:
+                self._ids[token] = slot - 1
+                return slot - 1
+            pos = (pos + 1) & mask
+
+    def __contains__(self, token):
+        return self.get(token) is not None
+
+    def index(self, token, *args):
+        index = self.get(token)
+        if index is None:
+            raise ValueError(f"{token!r} is not in vocab")
+        return index
+
+    def close(self):
+        for view in (self._strings, self._offsets, self._slots):
+            if isinstance(view, memoryview):
+                view.release()
+        self._buffer.close()
+
+
+class BinaryFileHandler(FileHandler):
+    """
+    File handler of the binary codex format
+
+    The file starts with the header `CODEX_HEADER`, followed by
+    the offsets of the strings (consonants, vowels and then tokens),
+    the slots of the hash index of the tokens and the string table
+    in UTF-8. All integers are unsigned 32 bits little-endian.
+    The file is memory-mapped when it is loaded, so the loading time
+    does not depend on the vocab size and the pages are shared between
+    the processes which load the same codex.
+
+    :param model: The instance of Tokenizer model
+    :param file_path: The path to the codex file
+    :param verify: Check the checksum of the codex when it is loaded,
+      which reads the whole file. Otherwise, only the sizes of the
+      sections are checked, and the pages are read when they are used.
+
+    :type model: phonesis.tokenizer.Tokenizer
+    :type file_path: `str`
+    :type verify: `bool`
+    """
+    def __init__(self, model, file_path, verify=False):
+        super().__init__(model, file_path)
+        self.verify = verify
+
+    def save(self):
+        """
+        Method to save data of Tokenizer instance into file_path
+        """
+        consonants = list(self.model.consonants or [])
+        vowels = list(self.model.vowels or [])
+        vocab = list(self.model.vocab or [])
+        encoded = [s.encode('utf-8') for s in consonants + vowels + vocab]
+
+        offsets = array('I', [0])
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+
+        n_slots = 1
+        while n_slots < 2 * len(vocab):
+            n_slots <<= 1
+        slots = array('I', bytes(4 * n_slots))
+        mask = n_slots - 1
+        first = len(consonants) + len(vowels)
+        seen = set()
+        for index, data in enumerate(encoded[first:]):
+            if data in seen:
+                continue
+            seen.add(data)
+            pos = _token_hash(data) & mask
+            while slots[pos]:
+                pos = (pos + 1) & mask
+            slots[pos] = index + 1
+
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+            slots.byteswap()
+        payload = offsets.tobytes() + slots.tobytes() + b''.join(encoded)
+        header = CODEX_HEADER.pack(
+            CODEX_MAGIC, CODEX_VERSION, 0, len(consonants), len(vowels),
+            len(vocab), n_slots, zlib.crc32(payload)
+        )
+        with open(self.file_path, mode='wb') as f:
+            f.write(header)
+            f.write(payload)
+        remove_delta(self.file_path)
+
+    def load(self):
+        """
+        Method to load data of tokenizer model from file_path specified
+
+        :rtype: phonesis.tokenizer.Tokenizer
+        """
+        if not os.path.isfile(self.file_path):
+            raise FileNotFoundError(f"No such model file at {self.file_path}")
+
+        with open(self.file_path, mode='rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(buffer)
+        magic, version, flags, n_cons, n_vows, n_vocab, n_slots, checksum = \
+            CODEX_HEADER.unpack_from(view)
+        if magic != CODEX_MAGIC:
+            raise ValueError(f"{self.file_path} is not a binary codex.")
+        if version != CODEX_VERSION:
+            raise ValueError(
+                f"Version {version} of the binary codex is not supported.")
+        payload = view[CODEX_HEADER.size:]
+        if self.verify and zlib.crc32(payload) != checksum:
+            raise ValueError(f"The codex {self.file_path} is corrupted.")
+
+        n_strings = n_cons + n_vows + n_vocab
+        end = 4 * (n_strings + 1)
+        if len(payload) < end + 4 * n_slots:
+            raise ValueError(f"The codex {self.file_path} is truncated.")
+        offsets = _as_uint32(payload[:end])
+        slots = _as_uint32(payload[end:end + 4 * n_slots])
+        strings = payload[end + 4 * n_slots:]
+        if offsets[n_strings] != len(strings):
+            raise ValueError(f"The codex {self.file_path} is truncated.")
+
+        def decode(i):
+            return str(strings[offsets[i]:offsets[i + 1]], 'utf-8')
+
+        self.model.consonants = [decode(i) for i in range(n_cons)]
+        self.model.vowels = [decode(i) for i in range(n_cons,
+                                                      n_cons + n_vows)]
+        self.model.vocab = MappedVocab(
+            buffer, offsets, slots, strings, n_cons + n_vows, n_vocab
+        )
+        self._apply_delta()
+        return self.model
+
+
+def get_file_handler(model, file_path, mode='r', verify=False):
+    """
+    Function to get the file handler of the format of a codex file
+
+    To read (`mode='r'`), an existing file is recognized by its first
+    bytes. To write (`mode='w'`), or when the file does not exist,
+    the format is chosen by the extension of the file path. `verify`
+    checks the checksum of a binary codex.
+
+    :type model: phonesis.tokenizer.Tokenizer
+    :type file_path: `str`
+    :type mode: `str`
+    :type verify: `bool`
+    :rtype: phonesis.fs.FileHandler
+    """
+    if mode == 'r' and os.path.isfile(file_path):
+        with open(file_path, mode='rb') as f:
+            binary = f.read(len(CODEX_MAGIC)) == CODEX_MAGIC
+    else:
+        binary = file_path.endswith(BINARY_EXTENSION)
+    if binary:
+        return BinaryFileHandler(model, file_path, verify)
+    return FileHandler(model, file_path)
+
+
+def read_vocab_size(file_path):
+    """
+    Function to read the vocab size of a codex without loading it
+    into a tokenizer
+
+    The size of a binary codex is read from its header. A JSON codex
+    is parsed, but no index of its tokens is built.
+
+    :type file_path: `str`
+    :rtype: `int`
+    """
+    with open(file_path, mode='rb') as f:
+        header = f.read(CODEX_HEADER.size)
+    if len(header) == CODEX_HEADER.size and header.startswith(CODEX_MAGIC):
+        n_vocab = CODEX_HEADER.unpack(header)[5]
+    else:
+        with open(file_path, mode='r', encoding='utf-8') as f:
+            n_vocab = len(json.load(f)['vocab'] or [])
+    return n_vocab + len(read_delta(file_path))
@@ -1,9 +1,225 @@
+import os
 import re
+import time
+import functools
+import unicodedata
+from itertools import accumulate, compress, repeat
+from operator import add, ne
+from array import array
 from .constants import DEFAULT_VOWS, DEFAULT_CONS
-from .fs import FileHandler
+from .fs import MappedVocab, get_file_handler
+from .cache import LRUCache
+from .arrays import EncodedTexts, TokenSpans
+from .stats import EncodeStats
+from .trie import TrieParser, WORD_BOUNDARY
 from .exceptions import UnknownTokenError
 
 
+class Normalizer:
+    """
+    Text normalizer compiled once for an alphabet
+
+    A text is normalized in a few passes: case folding and Unicode
+    NFC normalization (so a decomposed "e" + U+0301 becomes "é"),
+    removal of the characters which are neither letters of the alphabet
+    nor whitespaces, and split into words on the whitespaces.
+
+    :arg consonants: The list of consonants used to build the words
+      of the language
+    :arg vowels: The list of vowels used to build the words of the language
+
+    :type consonants: `list` of `str`
+    :type vowels: `list` of `str`
+    """
+    def __init__(self, consonants=DEFAULT_CONS, vowels=DEFAULT_VOWS):
+        letters = set()
+        for letter in list(consonants) + list(vowels):
+            letter = unicodedata.normalize('NFC', letter)
+            if len(letter) == 1:
+                letters.add(letter)
+        # The ASCII characters which are letters, as a `bytes.translate()`
+        # table giving 1 for a letter and 0 for the other characters.
+        ascii_letters = bytearray(256)
+        for letter in letters:
+            if letter.isascii():
+                ascii_letters[ord(letter)] = 1
+        self._ascii_letters = bytes(ascii_letters)
+        letters = ''.join(re.escape(letter) for letter in sorted(letters))
+        self._others = re.compile(f"[^{letters}\\s]+")
+
+    def __call__(self, x):
+        """
+        :type x: `str`
+        :rtype: `list` of `str`
+        """
+        data = unicodedata.normalize('NFC', x.casefold())
+        data = self._others.sub('', data)
+        return data.split()
+
+    def offsets(self, x):
+        """
+        Method to normalize a text, keeping the position in the text
+        of the characters of each word
+
+        Most of the words of an ASCII text are written as they are in `x`,
+        and only their start offset is kept. The offset of the other words
+        is -1, and the start and end offsets in `x` of each of their
+        characters are listed in `letters`, in the order of the words.
+        A non-ASCII word is case folded and normalized per base character
+        and its combining marks, so a folded "ß" ("ss") gives two characters
+        of the same span.
+
+        :type x: `str`
+        :returns: The words, their offsets (`array('i')`) and the offsets
+          of the characters of the words which are not written as they are
+        :rtype: `tuple`
+        """
+        ascii_text = x.isascii()
+        if ascii_text:
+            # The case folding keeps the positions of the characters.
+            x = x.lower()
+        remove = self._others.sub
+        spaces_only = x.isprintable()
+        if spaces_only:
+            # The chunks are separated by spaces, so they start at the
+            # cumulated lengths of the chunks and the spaces.
+            lengths = list(map(len, x.split(' ')))
+            offsets = list(accumulate(map(add, lengths, repeat(1)),
+                                      initial=0))
+            offsets.pop()
+        else:
+            chunks = x.split()
+            lengths = list(map(len, chunks))
+            offsets = []
+            add_offset = offsets.append
+            find = x.find
+            start = 0
+            for chunk in chunks:
+                start = find(chunk, start)
+                add_offset(start)
+                start += len(chunk)
+
+        letters = []
+        if ascii_text:
+            if spaces_only:
+                words = remove('', x).split(' ')
+            else:
+                words = remove('', '\n'.join(chunks)).split('\n')
+            # Most of the chunks are words, only the other ones (shorter
+            # once the other characters are removed) are checked.
+            changed = compress(range(len(words)),
+                               map(ne, map(len, words), lengths))
+            for i in changed:
+                word = words[i]
+                if word:
+                    start = offsets[i]
+                    chunk = x[start:start + lengths[i]]
+                    # The word holds all the letters of the chunk, so when
+                    # it is found in the chunk, only other characters are
+                    # around it.
+                    where = chunk.find(word)
+                    if where >= 0:
+                        offsets[i] += where
+                    else:
+                        offsets[i] = self._letter_offsets(
+                            chunk, start, letters)
+        else:
+            words = []
+            for i, length in enumerate(lengths):
+                start = offsets[i]
+                chunk = x[start:start + length]
+                if chunk.isascii():
+                    chunk = chunk.lower()
+                    word = remove('', chunk)
+                    where = chunk.find(word)
+                    if where >= 0:
+                        offsets[i] += where
+                    else:
+                        offsets[i] = self._letter_offsets(
+                            chunk, start, letters)
+                else:
+                    word = self._folded_word(chunk, start, letters)
+                    offsets[i] = -1
+                words.append(word)
+        if '' in words:
+            offsets = list(compress(offsets, words))
+            words = list(filter(None, words))
+        starts = array('i')
+        starts.fromlist(offsets)
+        return words, starts, letters
+
+    def _letter_offsets(self, chunk, start, letters):
+        """
+        :type chunk: `str`
+        :type start: `int`
+        :type letters: `list` of `tuple`
+        :rtype: `int`
+        """
+        is_letter = chunk.encode('ascii').translate(self._ascii_letters)
+        starts = array('i', compress(range(start, start + len(chunk)),
+                                     is_letter))
+        letters.append((starts, array('i', map(add, starts, repeat(1)))))
+        return -1
+
+    def _folded_word(self, chunk, start, letters):
+        """
+        :type chunk: `str`
+        :type start: `int`
+        :type letters: `list` of `tuple`
+        :rtype: `str`
+        """
+        others = self._others
+        word = []
+        starts = array('i')
+        ends = array('i')
+        for segment, seg_start, seg_end in _segments(chunk):
+            segment = unicodedata.normalize('NFC', segment.casefold())
+            for letter in segment:
+                if not others.match(letter):
+                    word.append(letter)
+                    starts.append(start + seg_start)
+                    ends.append(start + seg_end)
+        if word:
+            letters.append((starts, ends))
+        return ''.join(word)
+
+
+def _segments(x):
+    """
+    Function to split a text into segments made of a character
+    followed by its combining marks
+
+    :type x: `str`
+    :returns: The segments, with their start and end offsets
+    :rtype: typing.Generator[tuple]
+    """
+    combining = unicodedata.combining
+    start = 0
+    for end in range(1, len(x)):
+        if not combining(x[end]):
+            yield x[start:end], start, end
+            start = end
+    if x:
+        yield x[start:], start, len(x)
+
+
+@functools.lru_cache(maxsize=32)
+def _get_normalizer(consonants, vowels):
+    return Normalizer(consonants, vowels)
+
+
+def get_normalizer(consonants, vowels):
+    """
+    Function to get the normalizer of an alphabet, shared by all
+    the tokenizers which use the same alphabet
+
+    :type consonants: `list` of `str`
+    :type vowels: `list` of `str`
+    :rtype: phonesis.impl.Normalizer
+    """
+    return _get_normalizer(tuple(consonants), tuple(vowels))
+
+
 def preprocess(x, consonants, vowels):
     """
     Function to preprocess string
@@ -13,10 +229,7 @@ def preprocess(x, consonants, vowels):
     :type vowels: `list` of `str`
     :rtype: `list` of `str`
     """
-    data = x.lower()
-    data = ''.join([d for d in data \
-                    if d in (consonants + vowels + [' '])])
-    return re.split(r"[ \n\t\r]", data)
+    return get_normalizer(consonants, vowels)(x)
 
 
 class LetterParse:
@@ -77,7 +290,13 @@ class CVCparse(LetterParse):
                           re.compile(r'^c+v+c{2,}')]
 
 
-class Parser:
+class CascadeParser:
+    """
+    Reference syllable parser which tries the letter parsers one by one
+    on the remaining consonant/vowel encoding of the word
+
+    It is kept to check the results of `Parser`, which must be the same.
+    """
     def __init__(self, consonants=DEFAULT_CONS, vowels=DEFAULT_VOWS):
         self.consonants = consonants
         self.vowels = vowels
@@ -117,6 +336,145 @@ class Parser:
         return self.make_parsing(word)
 
 
+class _LetterClasses(dict):
+    """
+    Translation table of the letters into their class: `c` for
+    the consonants, `v` for the vowels and `?` for the other characters,
+    but the space which is kept to separate the words
+    """
+    def __missing__(self, key):
+        return '?'
+
+
+# One syllable of a consonant/vowel encoding. It gives the same tokens
+# as the cascade CVCparse, CVparse, Cparse, VCparse, Vparse:
+#   - the consonants followed by the vowels, and by one more consonant
+#     if it is followed by another consonant or ends the word;
+#   - otherwise, a single consonant (when no vowel remains);
+#   - otherwise, a single unclassified character.
+SYLLABLE_PATTERN = re.compile(r"c*v+(?:c(?=c|\Z))?|c|.", re.DOTALL)
+
+
+@functools.lru_cache(maxsize=65536)
+def split_pattern(letters):
+    """
+    Function to get the end position of each syllable of a consonant/vowel
+    encoding, like "cvcvc"
+
+    The positions only depend on the encoding, so they are memoized for all
+    the parsers: there are far fewer encodings than words.
+
+    :type letters: `str`
+    :rtype: `tuple` of `int`
+    """
+    return tuple(m.end() for m in SYLLABLE_PATTERN.finditer(letters))
+
+
+@functools.lru_cache(maxsize=32)
+def _get_letter_classes(consonants, vowels):
+    classes = _LetterClasses()
+    # A space is split like any other unclassified character.
+    classes[ord(' ')] = ' '
+    for letter in vowels:
+        letter = unicodedata.normalize('NFC', letter)
+        if len(letter) == 1:
+            classes.setdefault(ord(letter), 'v')
+    for letter in consonants:
+        letter = unicodedata.normalize('NFC', letter)
+        if len(letter) == 1:
+            classes[ord(letter)] = 'c'
+    return classes
+
+
+class Parser:
+    """
+    Syllable parser
+
+    The word is encoded into consonants and vowels, and then it is split
+    in a single left-to-right pass of `SYLLABLE_PATTERN`. The tokens are
+    the same as the ones of `CascadeParser`. A character which is neither
+    a consonant nor a vowel becomes a token on its own, so the parsing
+    always terminates.
+
+    :arg consonants: The list of consonants used to build the words
+      of the language
+    :arg vowels: The list of vowels used to build the words of the language
+
+    :type consonants: `list` of `str`
+    :type vowels: `list` of `str`
+    """
+    def __init__(self, consonants=DEFAULT_CONS, vowels=DEFAULT_VOWS):
+        self.consonants = consonants
+        self.vowels = vowels
+        self.stats = None
+        # The classification table is shared by the parsers
+        # of the same alphabet.
+        self._classes = _get_letter_classes(tuple(consonants),
+                                            tuple(vowels))
+
+    def _get_vow_cons_encoding(self, text):
+        return text.translate(self._classes)
+
+    def split_positions(self, word):
+        """
+        Method to get the end position of each syllable of a word
+
+        :type word: `str`
+        :rtype: `tuple` of `int`
+        """
+        return split_pattern(word.translate(self._classes))
+
+    def split_words(self, words):
+        """
+        Method to get the end position of each syllable of several words,
+        encoded into consonants and vowels all at once
+
+        :type words: `list` of `str`
+        :rtype: `list` of `tuple`
+        """
+        encodings = ' '.join(words).translate(self._classes).split(' ')
+        if len(encodings) != len(words):
+            # A word has a space of its own.
+            return list(map(self.split_positions, words))
+        return list(map(split_pattern, encodings))
+
+    def make_parsing(self, word):
+        assert word is not None, "Word is None, must be a string."
+        tokens = []
+        start = 0
+        for end in self.split_positions(word):
+            tokens.append(word[start:end])
+            start = end
+
+        tokens.append('#')
+        return tokens
+
+    def _make_parsing_timed(self, word):
+        start = time.perf_counter()
+        tokens = Parser.make_parsing(self, word)
+        self.stats.add_time('parse', time.perf_counter() - start)
+        return tokens
+
+    def enable_stats(self, stats=None):
+        """
+        Method to record the time spent in the parsing. When it is
+        disabled, the parsing runs without any instrumentation.
+
+        :type stats: phonesis.stats.EncodeStats
+        :rtype: phonesis.stats.EncodeStats
+        """
+        self.stats = stats if stats is not None else EncodeStats()
+        self.make_parsing = self._make_parsing_timed
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+        self.__dict__.pop('make_parsing', None)
+
+    def __call__(self, word):
+        return self.make_parsing(word)
+
+
 class Tokenizer:
     """
     Tokenizer model
@@ -125,21 +483,205 @@ class Tokenizer:
     :arg consonants: The list of consonants used to build the words
       of the language
     :arg vowels: The list of vowels used to build the words of the language
+    :arg cache_size: The maximum number of words whose tokens and ids
+      are kept in cache, 0 to disable the cache
+    :arg engine: The segmentation engine of the words: `rules` for
+      the consonant/vowel rules of `Parser`, or `greedy` or `optimal`
+      for the longest match of the tokens of the vocab (`TrieParser`)
+    :arg on_unknown: The policy of the unknown tokens: `keep` them with
+      the id -1, `raise` an `UnknownTokenError`, or `decompose` them
+      into the fewest tokens of the vocab (for a codex whose rare tokens
+      have been pruned by the training)
 
     :type vocab: typing.List[str]
     :type consonants: typing.List[str]
     :type vowels: typing.List[str]
+    :type cache_size: `int`
+    :type engine: `str`
+    :type on_unknown: `str`
     """
+    ENGINES = ('rules',) + TrieParser.MODES
+    DECODE_POLICIES = ('replace', 'skip', 'raise')
+    UNKNOWN_POLICIES = ('keep', 'raise', 'decompose')
+    SPANS_BLOCK = 64
+
     def __init__(
-        self, vocab=None, consonants=DEFAULT_CONS, vowels=DEFAULT_VOWS
+        self, vocab=None, consonants=DEFAULT_CONS, vowels=DEFAULT_VOWS,
+        cache_size=0, engine='rules', on_unknown='keep'
     ):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown segmentation engine: {engine}.")
+        if on_unknown not in self.UNKNOWN_POLICIES:
+            raise ValueError(f"Unknown policy: {on_unknown}.")
+        self._engine = engine
+        self.parse = None
+        self._vocab = None
+        self._token_ids = {}
+        self._id_tokens = ()
+        self._decode_table = None
+        self._decomposer = None
+        self._indexed_size = 0
+        self._cache = LRUCache(cache_size) if cache_size else None
+        self._stats = None
+
         self.vocab = vocab
         self.consonants = consonants
         self.vowels = vowels
 
-        self.parse = Parser(consonants, vowels)
-        self._file_handler = None
-        self._raises_except = False
+        self.normalize = get_normalizer(consonants, vowels)
+        self._build_parser()
+        self._file_path = None
+        self._on_unknown = on_unknown
+        self._raises_except = on_unknown == 'raise'
+
+    @property
+    def vocab(self):
+        return self._vocab
+
+    @vocab.setter
+    def vocab(self, value):
+        self._vocab = value
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Method to build the hashed token -> id index and the dense
+        id -> token table of the current vocab
+
+        When a token appears several times in the vocab, its first
+        position is kept, as `list.index()` does. A vocab loaded from
+        a binary codex brings its own index.
+        """
+        if isinstance(self._vocab, MappedVocab):
+            self._token_ids = self._vocab
+            self._id_tokens = self._vocab
+        else:
+            token_ids = {}
+            if self._vocab:
+                for index, token in enumerate(self._vocab):
+                    token_ids.setdefault(token, index)
+            self._token_ids = token_ids
+            self._id_tokens = tuple(self._vocab) if self._vocab else ()
+        self._indexed_size = len(self._id_tokens)
+        self._decode_table = None
+        self._decomposer = None
+        self.clear_cache()
+        if self._engine != 'rules' and self.parse is not None:
+            # The trie of the tokens follows the vocab.
+            self._build_parser()
+
+    def _build_parser(self):
+        """
+        Method to build the parser of the segmentation engine
+        """
+        if self._engine == 'rules':
+            parse = Parser(self.consonants, self.vowels)
+        else:
+            parse = TrieParser(self._id_tokens, self._engine)
+        if self._stats is not None:
+            parse.enable_stats(self._stats)
+        self.parse = parse
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @engine.setter
+    def engine(self, value):
+        if value not in self.ENGINES:
+            raise ValueError(f"Unknown segmentation engine: {value}.")
+        self._engine = value
+        self._sync_index()
+        self._build_parser()
+        self.clear_cache()
+
+    def _sync_index(self):
+        """
+        Method to rebuild the index when the vocab list has been
+        changed in place (with `append()` or `extend()` for example)
+
+        Only a change of the vocab size is noticed, a token replaced in
+        place needs `reindex()`.
+        """
+        size = len(self._vocab) if self._vocab else 0
+        if size != self._indexed_size:
+            self._build_index()
+
+    def reindex(self):
+        """
+        Method to rebuild the index and clear the word cache after
+        the tokens of the vocab have been changed in place, like
+        `model.vocab[2] = 'jour'`
+        """
+        self._build_index()
+
+    def token_to_id(self, token):
+        """
+        Method to get the id of a token
+
+        :type token: `str`
+        :rtype: `int`|None
+        """
+        self._sync_index()
+        return self._token_ids.get(token)
+
+    def id_to_token(self, index):
+        """
+        Method to get the token of an id
+
+        :type index: `int`
+        :rtype: `str`
+        """
+        self._sync_index()
+        return self._id_tokens[index]
+
+    @property
+    def cache(self):
+        """
+        The word cache, None when it is disabled
+
+        :rtype: phonesis.cache.LRUCache
+        """
+        return self._cache
+
+    @property
+    def cache_size(self):
+        return self._cache.capacity if self._cache is not None else 0
+
+    @cache_size.setter
+    def cache_size(self, value):
+        if not value:
+            self._cache = None
+        elif self._cache is not None:
+            self._cache.resize(value)
+        else:
+            self._cache = LRUCache(value)
+
+    def clear_cache(self):
+        if self._cache is not None:
+            self._cache.clear()
+
+    def cache_stats(self):
+        """
+        Method to get the statistics of the word cache
+
+        :rtype: `dict`
+        """
+        if self._cache is None:
+            return {}
+        return self._cache.stats()
+
+    @property
+    def on_unknown(self):
+        return self._on_unknown
+
+    @on_unknown.setter
+    def on_unknown(self, value):
+        if value not in self.UNKNOWN_POLICIES:
+            raise ValueError(f"Unknown policy: {value}.")
+        self._on_unknown = value
+        self._raises_except = value == 'raise'
+        self.clear_cache()
 
     @property
     def raises_except(self):
@@ -147,34 +689,368 @@ class Tokenizer:
 
     @raises_except.setter
     def raises_except(self, value):
-        self._raises_except = value
+        if value:
+            self.on_unknown = 'raise'
+        elif self._on_unknown == 'raise':
+            self.on_unknown = 'keep'
+
+    def _encode_word(self, word):
+        """
+        Method to get the tokens and ids of a single word
+
+        :type word: `str`
+        :returns: The tokens, their ids and the first unknown token
+          of the word (None if all tokens are known)
+        :rtype: `tuple`
+        """
+        cache = self._cache
+        if cache is not None:
+            entry = cache.get(word)
+            if entry is not None:
+                return entry
+
+        tokens = self.parse(word)
+        entry = self._lookup(tokens)
+        if cache is not None:
+            cache.put(word, entry)
+        return entry
+
+    def _lookup(self, tokens):
+        """
+        Method to find the ids of the tokens of a word
+
+        :type tokens: `list` of `str`
+        :returns: The tokens, their ids and the first unknown token
+        :rtype: `tuple`
+        """
+        token_ids = self._token_ids
+        indexes = []
+        unknown = None
+        for token in tokens:
+            index = token_ids.get(token)
+            if index is None:
+                index = -1
+                if unknown is None:
+                    unknown = token
+            indexes.append(index)
+        if unknown is not None and self._on_unknown == 'decompose':
+            return self._decompose(tokens)
+        return tuple(tokens), tuple(indexes), unknown
+
+    def _decompose(self, tokens):
+        """
+        Method to split the unknown tokens of a word into the fewest
+        tokens of the vocab
+
+        :type tokens: `list` of `str`
+        :returns: The tokens, their ids and the first unknown token,
+          a letter out of the vocab
+        :rtype: `tuple`
+        """
+        if self._decomposer is None:
+            self._decomposer = TrieParser(self._id_tokens, 'optimal')
+        token_ids = self._token_ids
+        pieces = []
+        indexes = []
+        unknown = None
+        for token in tokens:
+            index = token_ids.get(token)
+            if index is not None:
+                pieces.append(token)
+                indexes.append(index)
+                continue
+            for piece in self._decomposer.split(token):
+                index = token_ids.get(piece)
+                if index is None:
+                    index = -1
+                    if unknown is None:
+                        unknown = piece
+                pieces.append(piece)
+                indexes.append(index)
+        return tuple(pieces), tuple(indexes), unknown
+
+    def _encode_word_timed(self, word):
+        stats = self._stats
+        cache = self._cache
+        entry = cache.get(word) if cache is not None else None
+        if entry is not None:
+            stats.add_word(word, entry[1], cache_hit=True)
+            return entry
+
+        tokens = self.parse(word)
+        start = time.perf_counter()
+        entry = self._lookup(tokens)
+        stats.add_time('lookup', time.perf_counter() - start)
+        if cache is not None:
+            cache.put(word, entry)
+        stats.add_word(word, entry[1])
+        return entry
+
+    def _normalize_timed(self, x):
+        start = time.perf_counter()
+        words = self._normalizer(x)
+        self._stats.add_time('preprocess', time.perf_counter() - start)
+        self._stats.texts += 1
+        return words
+
+    def _install_stats(self):
+        self._normalizer = self.normalize
+        self.normalize = self._normalize_timed
+        self._encode_word = self._encode_word_timed
+        self.parse.enable_stats(self._stats)
+
+    def enable_stats(self):
+        """
+        Method to record the time spent in each stage of the encoding
+        (`preprocess`, `parse` and `lookup`) and to count the words,
+        the tokens and the unknown tokens. When the statistics are
+        disabled, the encoding runs without any instrumentation.
+
+        :rtype: phonesis.stats.EncodeStats
+        """
+        if self._stats is None:
+            self._stats = EncodeStats()
+            self._install_stats()
+        return self._stats
+
+    def disable_stats(self):
+        if self._stats is None:
+            return
+        self._stats = None
+        self.normalize = self._normalizer
+        del self._normalizer
+        del self._encode_word
+        self.parse.disable_stats()
+
+    def stats(self):
+        """
+        Method to get a snapshot of the statistics of the encoding
+
+        :rtype: `dict`
+        """
+        if self._stats is None:
+            return {}
+        return self._stats.snapshot()
+
+    def stats_prometheus(self, prefix='phonesis'):
+        """
+        Method to dump the statistics of the encoding in the Prometheus
+        text format
+
+        :type prefix: `str`
+        :rtype: `str`
+        """
+        if self._stats is None:
+            return ''
+        return self._stats.to_prometheus(prefix)
+
+    def encode_word(self, word):
+        """
+        Method to encode a single normalized word
+
+        :type word: `str`
+        :returns: The tokens, their ids and the first unknown token
+          of the word (None if all tokens are known)
+        :rtype: `tuple`
+        """
+        self._sync_index()
+        return self._encode_word(word)
 
     def encode(self, x):
         assert x is not None, "`x` is None. It not is a text."
-        words = preprocess(x, self.consonants, self.vowels)
-        # print(words)
+        words = self.normalize(x)
         indexes = []
         unknowns = {}
         tokens = []
 
+        self._sync_index()
         for pos, word in enumerate(words):
-            if not word:
-                continue
-            tokens = self.parse(word)
-            for token in tokens:
-                try:
-                    index = self.vocab.index(token)
-                    indexes.append(index)
-                except IndexError:
-                    indexes.append(-1)
-                    unknowns[word] = pos
-                    if self._raises_except:
-                        raise UnknownTokenError(
-                            f"\"{token}\" is unknown.", token
-                        )
+            word_tokens, word_indexes, unknown = self._encode_word(word)
+            tokens.extend(word_tokens)
+            indexes.extend(word_indexes)
+            if unknown is not None:
+                unknowns[word] = pos
+                if self._raises_except:
+                    raise UnknownTokenError(
+                        f"\"{unknown}\" is unknown.", unknown
+                    )
 
         return tokens, indexes, unknowns
 
+    def encode_ids(self, x):
+        """
+        Method to encode a text into its token ids only
+
+        :type x: `str`
+        :rtype: array.array
+        """
+        assert x is not None, "`x` is None. It not is a text."
+        words = self.normalize(x)
+        indexes = array('i')
+
+        self._sync_index()
+        for word in words:
+            _, word_indexes, unknown = self._encode_word(word)
+            indexes.extend(word_indexes)
+            if unknown is not None and self._raises_except:
+                raise UnknownTokenError(
+                    f"\"{unknown}\" is unknown.", unknown
+                )
+
+        return indexes
+
+    def encode_spans(self, x, boundaries=True):
+        """
+        Method to encode a text into its token ids, with the character
+        offsets of each token in the original (not normalized) text
+
+        The tokens are not returned as strings: `x[start:end]` gives
+        the characters of a token, as they are written in the text.
+
+        :arg x: The text to encode
+        :arg boundaries: Keep the word boundaries (`#`)
+
+        :type x: `str`
+        :type boundaries: `bool`
+        :rtype: phonesis.arrays.TokenSpans
+        """
+        assert x is not None, "`x` is None. It not is a text."
+        if self._stats is not None:
+            normalizer = self._normalizer
+        else:
+            normalizer = self.normalize
+        words, offsets, letters = normalizer.offsets(x)
+        letters = iter(letters)
+        ids = array('i')
+        starts = array('i')
+        ends = array('i')
+        # The ids and offsets of a block of words are gathered in lists,
+        # and moved into the arrays at the end of the block.
+        block_ids = []
+        block_starts = []
+        block_ends = []
+        add_id = block_ids.append
+        add_start = block_starts.append
+        add_end = block_ends.append
+
+        self._sync_index()
+        get = self._token_ids.get
+        boundary = get(WORD_BOUNDARY, -1)
+        split_words = self.parse.split_words
+        keep_unknowns = self._on_unknown == 'keep'
+        # The word cache and the statistics need the tokens of the words,
+        # otherwise the ids are found from the split positions only.
+        use_tokens = self._cache is not None or self._stats is not None
+        for first in range(0, len(words), self.SPANS_BLOCK):
+            block = words[first:first + self.SPANS_BLOCK]
+            splits = repeat(None) if use_tokens else split_words(block)
+            for word, offset, positions in zip(
+                    block, offsets[first:first + self.SPANS_BLOCK], splits):
+                if offset >= 0 and positions is not None:
+                    if not keep_unknowns:
+                        n_ids = len(block_ids)
+                    start = 0
+                    for end in positions:
+                        add_id(get(word[start:end], -1))
+                        add_start(offset + start)
+                        add_end(offset + end)
+                        start = end
+                    if keep_unknowns or boundary >= 0 \
+                            and -1 not in block_ids[n_ids:]:
+                        if boundaries:
+                            # The boundary is an empty span after
+                            # the last character of the word.
+                            add_id(boundary)
+                            add_start(offset + start)
+                            add_end(offset + start)
+                        continue
+                    del block_ids[n_ids:]
+                    del block_starts[n_ids:]
+                    del block_ends[n_ids:]
+
+                word_tokens, word_ids, unknown = self._encode_word(word)
+                if unknown is not None and self._raises_except:
+                    raise UnknownTokenError(
+                        f"\"{unknown}\" is unknown.", unknown
+                    )
+                block_ids.extend(word_ids if boundaries else word_ids[:-1])
+                if offset >= 0:
+                    char_starts = range(offset, offset + len(word))
+                    char_ends = range(offset + 1, offset + len(word) + 1)
+                else:
+                    char_starts, char_ends = next(letters)
+                add_start(char_starts[0])
+                for end in accumulate(map(len, word_tokens[:-2])):
+                    add_end(char_ends[end - 1])
+                    add_start(char_starts[end])
+                end = char_ends[-1]
+                add_end(end)
+                if boundaries:
+                    add_start(end)
+                    add_end(end)
+            ids.fromlist(block_ids)
+            starts.fromlist(block_starts)
+            ends.fromlist(block_ends)
+            block_ids.clear()
+            block_starts.clear()
+            block_ends.clear()
+        return TokenSpans(ids, starts, ends)
+
+    def encode_arrays(self, texts, max_length=None, pad_id=None,
+                      truncation=True, boundaries=True, unk_id=None):
+        """
+        Method to encode a batch of texts into a padded NumPy id matrix
+
+        :arg texts: The texts to encode
+        :arg max_length: The number of columns of the matrix, the length
+          of the longest text if it is not defined
+        :arg pad_id: The id of the padding, the vocab size by default
+        :arg truncation: Truncate the texts longer than `max_length`
+        :arg boundaries: Keep the ids of the word boundaries (`#`)
+        :arg unk_id: The id of the unknown tokens (-1 in `encode()`),
+          the vocab size + 1 by default, after the padding id
+
+        :type texts: typing.Iterable[str]
+        :type max_length: `int`
+        :type pad_id: `int`
+        :type truncation: `bool`
+        :type boundaries: `bool`
+        :type unk_id: `int`
+        :rtype: phonesis.arrays.BatchArrays
+        """
+        if pad_id is None:
+            pad_id = len(self.vocab)
+        if unk_id is None:
+            unk_id = len(self.vocab) + 1
+        encoded = EncodedTexts(self, texts, boundaries, unk_id)
+        return encoded.pad(None, max_length, pad_id, truncation)
+
+    def encode_buckets(self, texts, batch_size, max_length=None,
+                       pad_id=None, truncation=True, boundaries=True,
+                       unk_id=None):
+        """
+        Method to encode texts into padded NumPy batches of texts
+        of similar lengths, to reduce the padding
+
+        The `indices` of each batch give the positions of its rows
+        in `texts`.
+
+        :type texts: typing.Iterable[str]
+        :type batch_size: `int`
+        :type max_length: `int`
+        :type pad_id: `int`
+        :type truncation: `bool`
+        :type boundaries: `bool`
+        :type unk_id: `int`
+        :rtype: `list` of phonesis.arrays.BatchArrays
+        """
+        if pad_id is None:
+            pad_id = len(self.vocab)
+        if unk_id is None:
+            unk_id = len(self.vocab) + 1
+        encoded = EncodedTexts(self, texts, boundaries, unk_id)
+        return encoded.buckets(batch_size, max_length, pad_id, truncation)
+
     def forward(self, inp):
         out = []
         for s in inp:
@@ -182,17 +1058,191 @@ class Tokenizer:
             out.append(tok)
         return out
 
-    def load(self, file_path):
-        if not self._file_handler:
-            self._file_handler = FileHandler(self, file_path)
-        self._file_handler.load()
-        del self.parse
-        self.parse = Parser(self.consonants, self.vowels)
+    def encode_batch(self, texts, workers=None, chunk_size=256):
+        """
+        Method to encode a batch of texts with a pool of processes
+
+        :arg texts: The texts to encode
+        :arg workers: The number of worker processes, the number of CPUs
+          if it is not defined
+        :arg chunk_size: The number of texts sent to a worker at once
+
+        :type texts: typing.Sequence[str]
+        :type workers: `int`
+        :type chunk_size: `int`
+        :rtype: `list` of `tuple`
+        """
+        # The process pool is only imported by the batch encoding.
+        from .batch import BatchEncoder
+
+        with BatchEncoder(self, workers, chunk_size) as encoder:
+            return encoder.encode(texts)
+
+    def _get_decode_table(self):
+        """
+        Method to get the dense id -> token table of the decoding,
+        a tuple copy of the vocab when it is memory-mapped
+        """
+        self._sync_index()
+        if self._decode_table is None:
+            if isinstance(self._id_tokens, MappedVocab):
+                self._decode_table = tuple(self._id_tokens)
+            else:
+                self._decode_table = self._id_tokens
+        return self._decode_table
+
+    def _decode_tokens(self, table, ids, pad_id, on_unknown, unknown_token):
+        if hasattr(ids, 'tolist'):
+            ids = ids.tolist()
+        if pad_id is not None and pad_id in ids:
+            ids = [i for i in ids if i != pad_id]
+        if not ids:
+            return ''
+        if min(ids) >= 0:
+            # An id larger than the vocab is found by the lookup.
+            try:
+                return ''.join([table[i] for i in ids])
+            except IndexError:
+                pass
+
+        size = len(table)
+        if on_unknown not in self.DECODE_POLICIES:
+            raise ValueError(f"Unknown decoding policy: {on_unknown}.")
+        tokens = []
+        for i in ids:
+            if 0 <= i < size:
+                tokens.append(table[i])
+            elif on_unknown == 'replace':
+                tokens.append(unknown_token)
+            elif on_unknown == 'raise':
+                raise UnknownTokenError(f"The id {i} is unknown.", i)
+        return ''.join(tokens)
+
+    def decode_words(self, ids, pad_id=None, on_unknown='replace',
+                     unknown_token='?'):
+        """
+        Method to decode a sequence of token ids into words,
+        split on the word boundaries (`#`)
+
+        :arg ids: The token ids, a list or a NumPy array
+        :arg pad_id: The id of the padding, which is skipped, like the
+          vocab size for the id matrix of `encode_arrays()`. No id is
+          skipped by default: the vocab size is also the id of the unknown
+          tokens in the id streams of `phonesis-encode`.
+        :arg on_unknown: The policy of the ids out of the vocab (like
+          the id -1 of the unknown tokens): `replace` them
+          by `unknown_token`, `skip` them or `raise` an error
+        :arg unknown_token: The string of the unknown ids
+
+        :type ids: typing.Sequence[int]
+        :type pad_id: `int`
+        :type on_unknown: `str`
+        :type unknown_token: `str`
+        :rtype: `list` of `str`
+        """
+        table = self._get_decode_table()
+        text = self._decode_tokens(table, ids, pad_id, on_unknown,
+                                   unknown_token)
+        # The tokens have no whitespace, the boundaries become
+        # the separators of the words.
+        return text.replace('#', ' ').split()
+
+    def decode(self, ids, pad_id=None, on_unknown='replace',
+               unknown_token='?'):
+        """
+        Method to decode a sequence of token ids into a text,
+        whose words are separated by a space
+
+        :type ids: typing.Sequence[int]
+        :type pad_id: `int`
+        :type on_unknown: `str`
+        :type unknown_token: `str`
+        :rtype: `str`
+        """
+        return ' '.join(self.decode_words(ids, pad_id, on_unknown,
+                                          unknown_token))
+
+    def decode_batch(self, batch, pad_id=None, on_unknown='replace',
+                     unknown_token='?'):
+        """
+        Method to decode a batch of id sequences, like the rows of the
+        id matrix of `encode_arrays()`, into texts
+
+        :type batch: typing.Iterable[typing.Sequence[int]]
+        :type pad_id: `int`
+        :type on_unknown: `str`
+        :type unknown_token: `str`
+        :rtype: `list` of `str`
+        """
+        if hasattr(batch, 'tolist'):
+            batch = batch.tolist()
+        table = self._get_decode_table()
+        decode_tokens = self._decode_tokens
+        return [
+            ' '.join(decode_tokens(table, ids, pad_id, on_unknown,
+                                   unknown_token).replace('#', ' ').split())
+            for ids in batch
+        ]
+
+    def __getstate__(self):
+        # Only the codex is pickled, the index, the parser
+        # and the cache are rebuilt on the other side. A memory-mapped
+        # codex is sent by its path, to share its pages between processes.
+        state = dict(
+            vocab=None,
+            codex_path=None,
+            consonants=self.consonants,
+            vowels=self.vowels,
+            cache_size=self.cache_size,
+            on_unknown=self._on_unknown,
+            engine=self._engine,
+        )
+        if isinstance(self._vocab, MappedVocab):
+            state['codex_path'] = self._file_path
+        elif self._vocab:
+            state['vocab'] = list(self._vocab)
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(state['vocab'], state['consonants'], state['vowels'],
+                      state['cache_size'], state['engine'],
+                      state['on_unknown'])
+        if state['codex_path']:
+            self.load(state['codex_path'])
+
+    def load(self, file_path, verify=False):
+        """
+        Method to load a codex, in JSON or in binary format
+
+        :arg file_path: The path to the codex file
+        :arg verify: Check the checksum of a binary codex, which reads
+          the whole file instead of the pages used
+
+        :type file_path: `str`
+        :type verify: `bool`
+        """
+        get_file_handler(self, file_path, verify=verify).load()
+        self._file_path = os.path.abspath(file_path)
+        self.normalize = get_normalizer(self.consonants, self.vowels)
+        if self._engine == 'rules' and (
+            self.parse.consonants != self.consonants
+            or self.parse.vowels != self.vowels
+        ):
+            # The trie parsers are rebuilt with the vocab, and the parser
+            # of the rules only if the alphabet of the codex is another one.
+            self._build_parser()
+        self.clear_cache()
+        if self._stats is not None:
+            self._install_stats()
 
     def save(self, file_path):
-        if not self._file_handler:
-            self._file_handler = FileHandler(self, file_path)
-        self._file_handler.save()
+        """
+        Method to save the codex, in binary format if the file path
+        ends with `.phsx`, otherwise in JSON format
+
+        :type file_path: `str`
+        """
+        get_file_handler(self, file_path, mode='w').save()
 
     def __call__(self, inp):
         if not isinstance(inp, list):
@@ -1,18 +1,37 @@
 import os
 import sys
 import json
-import logging
-import logging.config
+import itertools
 from argparse import ArgumentParser
 
-from phonesis.train import Trainer
-from phonesis.impl import Parser, Tokenizer
+# The modules of the commands are imported by the commands themselves,
+# so a command only pays the import time of what it uses.
 
-logging.config.fileConfig('logging.conf')
-logger = logging.getLogger('phonesis')
+LOGGING_CONFIG = 'logging.conf'
+
+
+def configure_logging(file_path=LOGGING_CONFIG):
+    """
+    Function to configure the logging of a command, with the logging
+    configuration file of the working directory if there is one
+
+    :type file_path: `str`
+    """
+    import logging
+
+    if os.path.isfile(file_path):
+        import logging.config
+        logging.config.fileConfig(file_path, disable_existing_loggers=False)
+    else:
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s [%(levelname)8s] %(message)s",
+        )
 
 
 def run_letter_parser():
+    from phonesis.impl import Parser
+
     word = "each".lower()
     syparse = Parser()
     tokens = syparse(word)
@@ -29,80 +48,312 @@ def retrieve_alphabet(file_path):
         return consonants, vowels
 
 
-def read_text_file(file_path):
-    file_size = os.path.getsize(file_path)
-    size_read = 0
-    print("INFO: file size:", file_size)
-    with open(file_path, mode='r', encoding='utf-8') as file:
-        while line := file.readline():
-            size_read += len(line)
-            line_split = line.split()
-            print(f"{100 * (size_read / file_size):5.2f}", f"line: {line}")
-            if len(line_split) < 1:
-                continue
-            yield line_split[0]
+def parse_size(value):
+    """
+    Function to parse a size in bytes, with an optional
+    K, M or G suffix (powers of 1024)
+
+    :type value: `str`
+    :rtype: `int`
+    """
+    units = dict(K=1 << 10, M=1 << 20, G=1 << 30)
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def print_progress(bytes_read, file_size):
+    percent = 100 * bytes_read / file_size if file_size else 100.0
+    print(f"\033[2K\rINFO: {percent:6.2f}%"
+          f" ({bytes_read / 1e6:.1f}/{file_size / 1e6:.1f} MB)",
+          end='', flush=True)
+
+
+def read_text_file(file_path, **options):
+    from phonesis.reader import DictionaryReader
+
+    reader = DictionaryReader(file_path, progress=print_progress, **options)
+    print("INFO: file size:", reader.size)
+    yield from reader
+    print()
+    print(f"INFO: {reader.n_words} words read,"
+          f" {reader.n_duplicates} duplicates skipped.")
 
 
 def train():
     """
     Training function
     """
+    from phonesis.train import Trainer, ShardedTrainer, ExternalTrainer
+    from phonesis.impl import Tokenizer
+    from phonesis.fs import append_delta, save_remap
+
     parser = ArgumentParser(prog="Phonesis model training")
     parser.add_argument(
         '-a', "--alphabet", type=str,
         help="Provide a JSON file that provides the alphabet"
     )
     parser.add_argument(
-        '-d', "--dictionary", type=str,
+        '-d', "--dictionary", type=str, nargs='+',
         help=(
             "Provide the dictionary as text file that contents"
             " the words of the language."
         )
     )
+    parser.add_argument(
+        '-c', '--codex', type=str,
+        help=(
+            "Provide an existing codex to update it incrementally. Its"
+            " alphabet is used, the token ids are kept and the new tokens"
+            " are appended to its delta journal (<codex>.delta)."
+            " With --max-vocab, --min-count or --order frequency, the codex"
+            " is compacted into the output file instead, and the new ids of"
+            " its tokens are written into <output>.remap.json."
+        )
+    )
     parser.add_argument(
         '-o', '--output', type=str, default="output.json",
         help="Provide the output file path in which we will save the tokens."
     )
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help="The number of processes used to parse the dictionary."
+    )
+    parser.add_argument(
+        '--column', type=int, default=0,
+        help="The index of the column of the words in the dictionary."
+    )
+    parser.add_argument(
+        '--sep', type=str, default=None,
+        help="The separator of the columns, whitespaces by default."
+    )
+    parser.add_argument(
+        '--no-dedup', action='store_true',
+        help="Keep the duplicated words of the dictionary."
+    )
+    parser.add_argument(
+        '--max-vocab', type=int, default=None,
+        help=(
+            "The maximum number of tokens of the vocab. The rare tokens"
+            " are pruned and decomposed into the kept ones."
+        )
+    )
+    parser.add_argument(
+        '--min-count', type=int, default=1,
+        help="The minimum number of occurrences of a token to keep it."
+    )
+    parser.add_argument(
+        '--order', type=str, default='alphabetical',
+        choices=Trainer.ORDERS,
+        help="The order of the token ids, the most frequent first"
+             " with `frequency`."
+    )
+    parser.add_argument(
+        '--memory-limit', type=parse_size, default=None,
+        help=(
+            "Bound the memory of the token counts, like 512M or 2G. The"
+            " counts are spilled into sorted temporary files, merged at"
+            " the end into the output codex. The duplicated words are"
+            " not skipped in this mode."
+        )
+    )
+    parser.add_argument(
+        '--tmp-dir', type=str, default=None,
+        help="The directory of the temporary files of --memory-limit."
+    )
     args = parser.parse_args()
     alphabet_file = args.alphabet
-    dictionary_file = args.dictionary
+    dictionary_files = args.dictionary
     output_file = args.output
+    codex_file = args.codex
 
-    if not alphabet_file:
+    if not alphabet_file and not codex_file:
         print("ERRO: No alphabet file provided.")
         print("INFO: Please, provide alphabet json file "
               "separated in consonants and vowels.")
         print("INFO: Eg: {\"consonants\":[..], \"vowels\":[]}")
         exit(0)
-    if not dictionary_file:
+    if not dictionary_files:
         print("ERRO: No dictionary of language provided.")
         print("INFO: Please, provide a text (.txt) file "
               "that contains the words list of the language.")
         exit(0)
 
-    returned = retrieve_alphabet(alphabet_file)
-    if not returned:
-        print("The content formatting of alphabet file is not supported.")
-        exit(1)
-    consonants = returned[0]
-    vowels = returned[1]
-    dataset = read_text_file(dictionary_file)
+    configure_logging()
+    vocab = None
+    if codex_file:
+        codex = Tokenizer()
+        codex.load(codex_file)
+        consonants = codex.consonants
+        vowels = codex.vowels
+        vocab = list(codex.vocab)
+    else:
+        returned = retrieve_alphabet(alphabet_file)
+        if not returned:
+            print("The content formatting of alphabet file "
+                  "is not supported.")
+            exit(1)
+        consonants = returned[0]
+        vowels = returned[1]
 
     # Running training process:
-    trainer = Trainer(dataset, consonants, vowels)
+    reader_options = dict(column=args.column, sep=args.sep,
+                          dedup=not args.no_dedup)
+    budget = dict(max_vocab=args.max_vocab, min_count=args.min_count,
+                  order=args.order)
+    if args.memory_limit:
+        if args.workers > 1 or args.max_vocab or args.order != 'alphabetical':
+            print("ERRO: --memory-limit can not be used with --workers,"
+                  " --max-vocab or --order.")
+            exit(1)
+        # The set of the words read would not be bounded.
+        reader_options['dedup'] = False
+        dataset = itertools.chain.from_iterable(
+            read_text_file(f, **reader_options) for f in dictionary_files)
+        trainer = ExternalTrainer(
+            dataset, consonants, vowels, output_file, vocab,
+            memory_limit=args.memory_limit, min_count=args.min_count,
+            tmp_dir=args.tmp_dir,
+        )
+        n_vocab = trainer.run()
+        print("SUCC: Training done successfully!")
+        print(f"INFO: {n_vocab} new tokens written into {output_file},"
+              f" {trainer.n_runs} runs merged.")
+        return
+
+    if args.workers > 1:
+        trainer = ShardedTrainer(dictionary_files, consonants, vowels,
+                                 vocab, workers=args.workers,
+                                 reader_options=reader_options, **budget)
+    else:
+        # The words of the previous files are skipped too.
+        seen = set()
+        dataset = itertools.chain.from_iterable(
+            read_text_file(f, seen=seen, **reader_options)
+            for f in dictionary_files)
+        trainer = Trainer(dataset, consonants, vowels, vocab, **budget)
     n_vocab = trainer.run()
+    if codex_file and not trainer.compacts:
+        append_delta(codex_file, trainer.new_tokens)
+        print("SUCC: Codex updated successfully!")
+        print(f"INFO: {n_vocab} new tokens appended to {codex_file}.")
+        return
+
     model = trainer.get_model()
     model.save(output_file)
     print("SUCC: Training done successfully!")
-    print(f"INFO: The size of vocab: {n_vocab}")
+    print(f"INFO: The size of vocab: {len(model.vocab)}")
+    if trainer.compacts:
+        print(f"INFO: {trainer.n_pruned} tokens pruned.")
+    if codex_file:
+        remap_file = os.path.splitext(output_file)[0] + '.remap.json'
+        save_remap(remap_file, trainer.remap, vocab, model.vocab)
+        print(f"INFO: The new ids of the tokens of {codex_file}"
+              f" are written into {remap_file}.")
+
+
+def read_input_lines(file_paths):
+    """
+    Function to read the lines of the input files, or of the standard
+    input for `-`, without loading them in memory
+
+    :type file_paths: `list` of `str`
+    :rtype: typing.Generator[str]
+    """
+    from phonesis.stream import read_documents
+
+    for file_path in file_paths:
+        if file_path == '-':
+            for line in sys.stdin:
+                yield line.rstrip('\n')
+        else:
+            yield from read_documents(file_path)
+
+
+def format_record(text, tokens, ids, unknowns, output_format):
+    """
+    Function to format the encoding of a line, as a JSON line or
+    as a line of tab-separated text, tokens and ids
+
+    :rtype: `str`
+    """
+    if output_format == 'tsv':
+        return (f"{text.replace(chr(9), ' ')}\t{' '.join(tokens)}"
+                f"\t{' '.join(map(str, ids))}\n")
+    record = dict(text=text, tokens=tokens, ids=list(ids),
+                  unknowns=unknowns)
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def run_repl(model):
+    from phonesis.exceptions import UnknownTokenError
+
+    print("vocab size:", len(model.vocab))
+    while True:
+        try:
+            text = input(">_ ")
+        except EOFError:
+            break
+        if not text:
+            continue
+        try:
+            tokens, ids, unknowns = model.encode(text)
+        except UnknownTokenError as e:
+            print("ERRO:", e.args[0])
+            continue
+        print("INFO: seq:", tokens)
+        print("INFO: ind:", ids)
+        if unknowns:
+            print("INFO: unknown words:", list(unknowns))
 
 
 def inference():
+    import time
+    from phonesis.impl import Tokenizer
+    from phonesis.stream import encode_records
+
     parser = ArgumentParser(prog="Phonesis inference")
     parser.add_argument(
         '-m', '--model', type=str,
         help="The path to file where the phonesis tokens are stored."
     )
+    parser.add_argument(
+        '-i', '--input', type=str, nargs='+',
+        help=(
+            "The text files to encode, one text per line, `-` for the"
+            " standard input. Without input files, the standard input is"
+            " encoded, or read line by line if it is a terminal."
+        )
+    )
+    parser.add_argument(
+        '-o', '--output', type=str, default=None,
+        help="The output file, the standard output by default."
+    )
+    parser.add_argument(
+        '-f', '--format', type=str, default='jsonl', choices=('jsonl', 'tsv'),
+        help=(
+            "The output format: one JSON object per line, or the text,"
+            " the tokens and the ids separated by tabs."
+        )
+    )
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help="The number of processes used to encode the lines."
+    )
+    parser.add_argument(
+        '-b', '--batch-size', type=int, default=256,
+        help="The number of lines sent to a process at once."
+    )
+    parser.add_argument(
+        '--on-unknown', type=str, default='keep',
+        choices=('keep', 'skip', 'raise', 'decompose'),
+        help=(
+            "What to do with the unknown tokens: keep them with the id -1,"
+            " skip the lines which have some, stop at the first one, or"
+            " decompose them into known tokens."
+        )
+    )
     args = parser.parse_args()
     model_fp = args.model
 
@@ -113,17 +364,245 @@ def inference():
         print("INFO: Eg: {\"consonants\":[..], \"vowels\":[], \"vocab\":[]}")
         exit(0)
 
-    model = Tokenizer()
+    # The lines with unknown tokens are skipped or stop the run here,
+    # so the workers never raise on a line.
+    on_unknown = args.on_unknown
+    model = Tokenizer(
+        cache_size=65536,
+        on_unknown='decompose' if on_unknown == 'decompose' else 'keep',
+    )
     model.load(model_fp)
-    model.raises_except = True
-    print("vocab size:", len(model.vocab))
-    while True:
-        text = input(">_ ")
-        if not text:
-            continue
-        res = model([text])
-        print("INFO: seq:", res[0][0])
-        print("INFO: ind:", res[0][1])
+    input_files = args.input
+    if not input_files:
+        if sys.stdin.isatty():
+            if on_unknown == 'raise':
+                model.raises_except = True
+            run_repl(model)
+            return
+        input_files = ['-']
+
+    output = open(args.output, mode='w', encoding='utf-8') \
+        if args.output else sys.stdout
+    n_lines = 0
+    n_tokens = 0
+    n_unknown = 0
+    start = time.perf_counter()
+    try:
+        lines, texts = itertools.tee(read_input_lines(input_files))
+        records = encode_records(model, lines, args.workers,
+                                 args.batch_size)
+        for text, (tokens, ids, unknowns) in zip(texts, records):
+            n_lines += 1
+            if unknowns:
+                n_unknown += 1
+                if on_unknown == 'raise':
+                    word = next(iter(unknowns))
+                    print(f"ERRO: line {n_lines}: the word \"{word}\""
+                          f" has unknown tokens.", file=sys.stderr)
+                    exit(1)
+                if on_unknown == 'skip':
+                    continue
+            n_tokens += len(ids)
+            output.write(format_record(text, tokens, ids, unknowns,
+                                       args.format))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        else:
+            output.flush()
+
+    duration = time.perf_counter() - start
+    rate = 1 / duration if duration > 0 else 0.0
+    skipped = n_unknown if on_unknown == 'skip' else 0
+    print(f"INFO: {n_lines} lines, {n_tokens} tokens in {duration:.2f} s"
+          f" ({n_lines * rate:.0f} lines/s, {n_tokens * rate:.0f} tokens/s),"
+          f" {n_unknown} lines with unknown tokens, {skipped} skipped.",
+          file=sys.stderr)
+
+
+def encode():
+    """
+    Function to encode a large text file into packed binary token ids
+    """
+    from phonesis.impl import Tokenizer
+    from phonesis.stream import encode_file
+
+    parser = ArgumentParser(prog="Phonesis corpus encoding")
+    parser.add_argument(
+        '-m', '--model', type=str,
+        help="The path to file where the phonesis tokens are stored."
+    )
+    parser.add_argument(
+        '-i', '--input', type=str,
+        help="The text file to encode, one document per line."
+    )
+    parser.add_argument(
+        '-o', '--output', type=str, default="output",
+        help=(
+            "The output path without extension. The ids are written"
+            " into <output>.bin and the document offsets into <output>.idx."
+        )
+    )
+    parser.add_argument(
+        '--varint', action='store_true',
+        help="Write the ids as variable length integers."
+    )
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help="The number of processes used to encode the documents."
+    )
+    args = parser.parse_args()
+
+    if not args.model:
+        print("ERRO: No model file provided.")
+        exit(0)
+    if not args.input:
+        print("ERRO: No input text file provided.")
+        exit(0)
+
+    model = Tokenizer(cache_size=65536)
+    model.load(args.model)
+    n_docs, n_ids = encode_file(
+        model, args.input, args.output, args.varint, args.workers
+    )
+    print(f"INFO: {n_docs} documents and {n_ids} token ids written"
+          f" into {args.output}.bin")
+
+
+def convert():
+    """
+    Function to convert a codex file, from JSON to binary format
+    or from binary to JSON format
+    """
+    from phonesis.impl import Tokenizer
+
+    parser = ArgumentParser(prog="Phonesis codex conversion")
+    parser.add_argument(
+        '-i', '--input', type=str,
+        help="The path to the codex file to convert."
+    )
+    parser.add_argument(
+        '-o', '--output', type=str,
+        help=(
+            "The path to the converted codex file. It is written in"
+            " binary format if it ends with .phsx, otherwise in JSON."
+        )
+    )
+    args = parser.parse_args()
+    if not args.input or not args.output:
+        print("ERRO: The input and output codex files must be provided.")
+        exit(0)
+
+    model = Tokenizer()
+    model.load(args.input)
+    model.save(args.output)
+    print(f"SUCC: {len(model.vocab)} tokens written into {args.output}.")
+
+
+def merge():
+    """
+    Function to merge several codexes into one multilingual codex
+    """
+    from phonesis.impl import Tokenizer
+    from phonesis.merge import (merge_codexes, save_remap_table,
+                                remap_table_path)
+
+    parser = ArgumentParser(prog="Phonesis codex merge")
+    parser.add_argument(
+        '-i', '--input', type=str, nargs='+',
+        help="The paths to the codex files to merge."
+    )
+    parser.add_argument(
+        '-o', '--output', type=str, default="merged.json",
+        help=(
+            "The path to the merged codex file, in binary format if it ends"
+            " with .phsx. The new ids of the tokens of each input codex are"
+            " written into <output>.<input index>.<input name>.remap,"
+            " as uint32."
+        )
+    )
+    args = parser.parse_args()
+    if not args.input:
+        print("ERRO: No codex file provided.")
+        exit(0)
+
+    configure_logging()
+    models = []
+    for file_path in args.input:
+        model = Tokenizer()
+        model.load(file_path)
+        models.append(model)
+    merged, remaps = merge_codexes(models)
+    merged.save(args.output)
+
+    n_tokens = sum(len(model.vocab) for model in models)
+    print(f"SUCC: {len(merged.vocab)} tokens written into {args.output},"
+          f" {n_tokens - len(merged.vocab)} shared tokens merged.")
+    for index, (file_path, table) in enumerate(zip(args.input, remaps)):
+        remap_path = remap_table_path(args.output, file_path, index)
+        save_remap_table(remap_path, table)
+        print(f"INFO: The new ids of {file_path} are in {remap_path}.")
+
+
+def serve():
+    """
+    Function to run the tokenization server
+    """
+    import asyncio
+    from phonesis.impl import Tokenizer
+    from phonesis.serve import TokenizerServer
+
+    parser = ArgumentParser(prog="Phonesis tokenization server")
+    parser.add_argument(
+        '-m', '--model', type=str,
+        help="The path to file where the phonesis tokens are stored."
+    )
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument(
+        '--unix', type=str,
+        help="Listen on this Unix socket instead of a TCP port."
+    )
+    parser.add_argument(
+        '--max-batch', type=int, default=64,
+        help="The maximum number of texts in a micro-batch."
+    )
+    parser.add_argument(
+        '--max-delay', type=float, default=5.0,
+        help="The latency window of a micro-batch, in milliseconds."
+    )
+    parser.add_argument(
+        '--max-queue', type=int, default=1024,
+        help="The maximum number of waiting requests."
+    )
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help="The number of processes used to encode a micro-batch."
+    )
+    args = parser.parse_args()
+    if not args.model:
+        print("ERRO: No model file provided.")
+        exit(0)
+
+    configure_logging()
+    model = Tokenizer(cache_size=65536)
+    model.load(args.model)
+    server = TokenizerServer(
+        model, args.max_batch, args.max_delay / 1000, args.max_queue,
+        args.workers
+    )
+
+    async def run():
+        await server.start(args.host, args.port, args.unix)
+        address = args.unix or f"{args.host}:{args.port}"
+        print(f"INFO: Listening on {address}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+            print("INFO: stats:", json.dumps(server.stats()))
+
+    asyncio.run(run())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,195 @@
+import os
+import sys
+import heapq
+import logging
+from array import array
+
+from .stream import IdStreamReader, IdStreamWriter, VARINT
+
+logger = logging.getLogger(__name__)
+
+REMAP_EXTENSION = '.remap'
+
+
+def _warn_conflict(letter, kept_class):
+    logger.warning(f"\"{letter}\" is kept as a {kept_class},"
+                   f" as in the first alphabet which has it.")
+
+
+def merge_alphabets(alphabets):
+    """
+    Function to build the union of several alphabets
+
+    The letters keep the order in which they are found. A letter which is
+    a consonant in an alphabet and a vowel in another one keeps the class
+    of the first alphabet, with a warning.
+
+    :type alphabets: `list` of `tuple`
+    :returns: The consonants and the vowels
+    :rtype: `tuple`
+    """
+    consonants = {}
+    vowels = {}
+    for source_consonants, source_vowels in alphabets:
+        for letter in source_consonants:
+            if letter in vowels:
+                _warn_conflict(letter, 'vowel')
+                continue
+            consonants.setdefault(letter)
+        for letter in source_vowels:
+            if letter in consonants:
+                _warn_conflict(letter, 'consonant')
+                continue
+            vowels.setdefault(letter)
+    return list(consonants), list(vowels)
+
+
+def _sorted_entries(source, vocab):
+    entries = sorted(zip(vocab, range(len(vocab))))
+    for token, old_id in entries:
+        yield token, source, old_id
+
+
+def merge_vocabs(vocabs):
+    """
+    Function to build the sorted union of several vocabs, with the
+    new id of each token of each vocab
+
+    The vocabs are sorted and merged together, so a token found in
+    several vocabs is kept once.
+
+    :type vocabs: `list` of `list` of `str`
+    :returns: The merged vocab, and one remap table per vocab: an
+      `array('I')` of the new ids indexed by the old ids
+    :rtype: `tuple`
+    """
+    remaps = [array('I', [0]) * len(vocab) for vocab in vocabs]
+    merged = heapq.merge(*(_sorted_entries(source, vocab)
+                           for source, vocab in enumerate(vocabs)))
+    vocab = []
+    for token, source, old_id in merged:
+        if not vocab or vocab[-1] != token:
+            vocab.append(token)
+        remaps[source][old_id] = len(vocab) - 1
+    return vocab, remaps
+
+
+def merge_codexes(models):
+    """
+    Function to merge several tokenizer models into one multilingual
+    model, with a union alphabet and a de-duplicated vocab
+
+    :type models: `list` of phonesis.impl.Tokenizer
+    :returns: The merged model and the remap tables of the models
+    :rtype: `tuple`
+    """
+    from .impl import Tokenizer
+
+    consonants, vowels = merge_alphabets(
+        [(model.consonants, model.vowels) for model in models])
+    vocab, remaps = merge_vocabs(
+        [list(model.vocab or []) for model in models])
+    return Tokenizer(vocab, consonants, vowels), remaps
+
+
+def save_remap_table(file_path, table):
+    """
+    Function to write a remap table as little-endian `uint32`
+
+    :type file_path: `str`
+    :type table: array.array
+    """
+    values = array('I', table)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    with open(file_path, mode='wb') as f:
+        values.tofile(f)
+
+
+def load_remap_table(file_path):
+    """
+    Function to read a remap table written by `save_remap_table()`
+
+    :type file_path: `str`
+    :rtype: array.array
+    """
+    values = array('I')
+    with open(file_path, mode='rb') as f:
+        values.frombytes(f.read())
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def remap_ids(ids, table, unknown_id=-1):
+    """
+    Function to translate the ids of a source codex into the ids
+    of the merged codex
+
+    :arg ids: The ids in the source codex
+    :arg table: The remap table of the source codex
+    :arg unknown_id: The id of the ids out of the source vocab
+
+    :type ids: typing.Sequence[int]
+    :type table: array.array
+    :type unknown_id: `int`
+    :rtype: array.array
+    """
+    if not ids:
+        return array('i')
+    if min(ids) >= 0:
+        # An id larger than the vocab is found by the lookup.
+        try:
+            return array('i', [table[i] for i in ids])
+        except IndexError:
+            pass
+    size = len(table)
+    return array('i', [table[i] if 0 <= i < size else unknown_id
+                       for i in ids])
+
+
+def remap_stream(input_prefix, output_prefix, table, vocab_size):
+    """
+    Function to translate the ids of a packed id stream (`phonesis-encode`)
+    into the ids of the merged codex
+
+    :arg input_prefix: The path of the input files without extension
+    :arg output_prefix: The path of the output files without extension
+    :arg table: The remap table of the codex of the input stream
+    :arg vocab_size: The size of the merged vocab
+
+    :type input_prefix: `str`
+    :type output_prefix: `str`
+    :type table: array.array
+    :type vocab_size: `int`
+    :returns: The number of documents
+    :rtype: `int`
+    """
+    with IdStreamReader(input_prefix) as reader, \
+            IdStreamWriter(output_prefix, vocab_size,
+                           reader.encoding == VARINT) as writer:
+        for ids in reader:
+            writer.write(remap_ids(ids, table, vocab_size))
+        return writer.n_docs
+
+
+def remap_table_path(output, source, index):
+    """
+    Function to get the path of the remap table of a source codex,
+    next to the merged codex
+
+    The index of the source codex in the merge is in the name, so two
+    codexes with the same file name (`fr/codex.json` and `en/codex.json`)
+    get their own tables.
+
+    :arg output: The path to the merged codex
+    :arg source: The path to the source codex
+    :arg index: The index of the source codex in the merge
+
+    :type output: `str`
+    :type source: `str`
+    :type index: `int`
+    :rtype: `str`
+    """
+    name = os.path.splitext(os.path.basename(source))[0]
+    return f"{os.path.splitext(output)[0]}.{index}.{name}{REMAP_EXTENSION}"
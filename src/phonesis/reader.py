@@ -0,0 +1,171 @@
+import os
+import bz2
+import gzip
+import lzma
+import time
+
+# The first bytes of the compressed files, and their module.
+COMPRESSIONS = (
+    (b'\x1f\x8b', gzip),
+    (b'BZh', bz2),
+    (b'\xfd7zXZ\x00', lzma),
+)
+
+
+def get_compression(file_path):
+    """
+    Function to find the compression module of a file from its first
+    bytes, None if it is not compressed
+
+    :type file_path: `str`
+    :rtype: module
+    """
+    with open(file_path, mode='rb') as f:
+        head = f.read(8)
+    for magic, module in COMPRESSIONS:
+        if head.startswith(magic):
+            return module
+    return None
+
+
+class DictionaryReader:
+    """
+    Reader of the words of a dictionary file
+
+    The file is read in large blocks, decompressed if it is compressed
+    with gzip, bz2 or xz. Each line can contain several columns, like
+    a word and its frequency or its pronunciation, and `column` selects
+    the one which is returned. The words already read are skipped if
+    `dedup` is true. The progress is reported with the number of bytes
+    of the file consumed, at most once per `progress_interval` seconds.
+
+    A plain file can be read only on a byte range: the lines which
+    start in [start, end) are read.
+
+    :arg file_path: The path to the dictionary file
+    :arg column: The index of the column to read
+    :arg sep: The separator of the columns, whitespaces by default
+    :arg dedup: Skip the words which were already read
+    :arg block_size: The number of bytes read at once
+    :arg progress: A function called with the number of bytes consumed
+      and the size of the file
+    :arg progress_interval: The minimum time between two progress calls
+    :arg start: The first byte of the range to read
+    :arg end: The end of the range to read, the end of file by default
+    :arg seen: The words already read, a set shared by the readers of
+      several files to skip the words found in the previous ones
+
+    :type file_path: `str`
+    :type column: `int`
+    :type sep: `str`
+    :type dedup: `bool`
+    :type block_size: `int`
+    :type progress: typing.Callable[[int, int], None]
+    :type progress_interval: `float`
+    :type start: `int`
+    :type end: `int`
+    :type seen: `set` of `str`
+    """
+    def __init__(self, file_path, column=0, sep=None, dedup=True,
+                 block_size=1 << 20, progress=None, progress_interval=0.5,
+                 start=0, end=None, seen=None):
+        self.file_path = file_path
+        self.column = column
+        self.sep = sep
+        self.dedup = dedup
+        self.block_size = block_size
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.start = start
+        self.end = end
+        self.seen = seen
+        self.compression = get_compression(file_path)
+        if self.compression and (start or end is not None):
+            raise ValueError(
+                "A byte range can not be read in a compressed file.")
+
+        self.size = os.path.getsize(file_path)
+        self.bytes_read = 0
+        self.n_lines = 0
+        self.n_words = 0
+        self.n_duplicates = 0
+
+    def _aligned_range(self, raw):
+        """
+        Method to move the range bounds to the start of the lines
+        """
+        def line_start(pos):
+            if pos <= 0:
+                return 0
+            if pos >= self.size:
+                return self.size
+            raw.seek(pos - 1)
+            return pos - 1 + len(raw.readline())
+
+        end = self.size if self.end is None else self.end
+        return line_start(self.start), line_start(end)
+
+    def _blocks(self, raw):
+        if self.compression:
+            with self.compression.open(raw, mode='rb') as f:
+                while block := f.read(self.block_size):
+                    yield block
+            return
+
+        start, end = self._aligned_range(raw)
+        raw.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = raw.read(min(self.block_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+    def _lines(self, raw):
+        rest = b''
+        for block in self._blocks(raw):
+            block = rest + block
+            last = block.rfind(b'\n')
+            if last < 0:
+                rest = block
+                continue
+            rest = block[last + 1:]
+            yield from block[:last].decode('utf-8').split('\n')
+            self._report(raw)
+        if rest:
+            yield rest.decode('utf-8')
+
+    def _report(self, raw, force=False):
+        self.bytes_read = raw.tell() - self.start
+        if not self.progress:
+            return
+        now = time.monotonic()
+        if force or now - self._last_report >= self.progress_interval:
+            self._last_report = now
+            self.progress(self.bytes_read, self.size)
+
+    def __iter__(self):
+        column = self.column
+        sep = self.sep
+        seen = None
+        if self.dedup:
+            seen = self.seen if self.seen is not None else set()
+        self._last_report = time.monotonic()
+        with open(self.file_path, mode='rb') as raw:
+            for line in self._lines(raw):
+                self.n_lines += 1
+                columns = line.split(sep)
+                if len(columns) <= column:
+                    continue
+                word = columns[column].strip()
+                if not word:
+                    continue
+                if seen is not None:
+                    if word in seen:
+                        self.n_duplicates += 1
+                        continue
+                    seen.add(word)
+                self.n_words += 1
+                yield word
+            self._report(raw, force=True)
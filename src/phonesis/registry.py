@@ -0,0 +1,169 @@
+import bisect
+import logging
+
+from .impl import Tokenizer
+from .fs import read_vocab_size
+from .exceptions import UnknownTokenError
+
+logger = logging.getLogger(__name__)
+
+
+class CodexRegistry:
+    """
+    Registry of several codexes which tokenizes each word with the codex
+    which covers it best
+
+    The codexes are loaded only when they are first needed. Each word is
+    tried with the codexes in the configured order, and the first one
+    which knows all the tokens of the word is used. If none of them
+    knows all the tokens, the codex which knows the largest part of
+    them is used. The ids of the codexes are mapped into one id space:
+    the ids of a codex are shifted by the sum of the vocab sizes of
+    the codexes before it. The tokenizers of the codexes which share
+    an alphabet share their normalization and classification tables.
+
+    :arg codexes: The names of the codexes and the paths to their files,
+      in the fallback order
+    :arg cache_size: The size of the word cache of each tokenizer
+
+    :type codexes: `list` of `tuple`|`dict`
+    :type cache_size: `int`
+    """
+    def __init__(self, codexes, cache_size=0):
+        if isinstance(codexes, dict):
+            codexes = list(codexes.items())
+        assert codexes, "At least one codex must be provided."
+        self.names = [name for name, _ in codexes]
+        self.paths = dict(codexes)
+        self.cache_size = cache_size
+        self.raises_except = False
+        self._tokenizers = {}
+        self._sizes = {}
+
+    @property
+    def loaded(self):
+        """
+        The names of the codexes loaded
+        """
+        return [name for name in self.names if name in self._tokenizers]
+
+    def tokenizer(self, name):
+        """
+        Method to get the tokenizer of a codex, loaded on the first call
+
+        :type name: `str`
+        :rtype: phonesis.impl.Tokenizer
+        """
+        model = self._tokenizers.get(name)
+        if model is None:
+            logger.debug(f"Loading the codex {name}.")
+            model = Tokenizer(cache_size=self.cache_size)
+            model.load(self.paths[name])
+            self._tokenizers[name] = model
+            self._sizes[name] = len(model.vocab)
+        return model
+
+    def size(self, name):
+        """
+        Method to get the vocab size of a codex, read from its file
+        without loading it
+
+        :type name: `str`
+        :rtype: `int`
+        """
+        if name not in self._sizes:
+            self._sizes[name] = read_vocab_size(self.paths[name])
+        return self._sizes[name]
+
+    def offset(self, name):
+        """
+        Method to get the first id of a codex in the combined id space
+
+        :type name: `str`
+        :rtype: `int`
+        """
+        index = self.names.index(name)
+        return sum(self.size(n) for n in self.names[:index])
+
+    def __len__(self):
+        return sum(self.size(name) for name in self.names)
+
+    def id_to_token(self, index):
+        """
+        Method to get the codex and the token of a combined id
+
+        :type index: `int`
+        :rtype: `tuple` of `str`
+        """
+        offsets = [self.offset(name) for name in self.names]
+        pos = bisect.bisect_right(offsets, index) - 1
+        if index < 0 or index >= len(self):
+            raise IndexError("Token index out of range.")
+        name = self.names[pos]
+        return name, self.tokenizer(name).id_to_token(index - offsets[pos])
+
+    def encode_word(self, raw_word):
+        """
+        Method to encode one word with the codex which covers it best
+
+        :type raw_word: `str`
+        :returns: The name of the codex used, the tokens and their
+          combined ids, or None if the word has no letter in any alphabet
+        :rtype: `tuple`
+        """
+        best = None
+        best_known = -1
+        for name in self.names:
+            model = self.tokenizer(name)
+            words = model.normalize(raw_word)
+            if not words:
+                continue
+            tokens, indexes = [], []
+            for word in words:
+                word_tokens, word_indexes, _ = model.encode_word(word)
+                tokens.extend(word_tokens)
+                indexes.extend(word_indexes)
+            known = sum(1 for i in indexes if i >= 0)
+            if known > best_known:
+                best = (name, tokens, indexes)
+                best_known = known
+            if known == len(indexes):
+                break
+
+        if best is None:
+            return None
+        name, tokens, indexes = best
+        offset = self.offset(name)
+        indexes = [i + offset if i >= 0 else -1 for i in indexes]
+        return name, tokens, indexes
+
+    def encode(self, x):
+        """
+        Method to encode a text, word by word
+
+        :type x: `str`
+        :returns: The tokens, their combined ids, the words with unknown
+          tokens and the name of the codex used for each word
+        :rtype: `tuple`
+        """
+        assert x is not None, "`x` is None. It not is a text."
+        tokens, indexes, unknowns, routes = [], [], {}, []
+        for pos, raw_word in enumerate(x.split()):
+            encoded = self.encode_word(raw_word)
+            if encoded is None:
+                continue
+            name, word_tokens, word_indexes = encoded
+            tokens.extend(word_tokens)
+            indexes.extend(word_indexes)
+            routes.append(name)
+            if -1 in word_indexes:
+                unknowns[raw_word] = pos
+                if self.raises_except:
+                    token = word_tokens[word_indexes.index(-1)]
+                    raise UnknownTokenError(f"\"{token}\" is unknown.", token)
+        return tokens, indexes, unknowns, routes
+
+    def __call__(self, inp):
+        if not isinstance(inp, list):
+            inp = [inp]
+        return [self.encode(s) for s in inp]
@@ -0,0 +1,348 @@
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .batch import BatchEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class ServerOverloaded(Exception):
+    """
+    The queue of the requests is full
+    """
+    pass
+
+
+def percentile(values, q):
+    """
+    Function to compute the percentile `q` (between 0 and 100)
+    of a list of values
+
+    :type values: typing.Sequence[float]
+    :type q: `float`
+    :rtype: `float`
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = round(q / 100 * (len(ordered) - 1))
+    return ordered[rank]
+
+
+class TokenizerServer:
+    """
+    Asyncio tokenization server
+
+    The requests are newline-delimited JSON objects, `{"id": 1,
+    "texts": ["..."]}`, and each response is a JSON line `{"id": 1,
+    "results": [{"tokens": [..], "ids": [..], "unknowns": {..}}]}`.
+    The request `{"op": "stats"}` returns the statistics of the server.
+    The texts of the concurrent requests are gathered into micro-batches,
+    within `max_delay` seconds, and encoded in a worker thread (and
+    a pool of processes if `workers` is greater than 1), so the event
+    loop is never blocked. When `max_queue` requests are waiting,
+    the new ones are rejected with an error.
+
+    :arg model: The instance of Tokenizer model
+    :arg max_batch: The maximum number of texts in a micro-batch
+    :arg max_delay: The maximum time in seconds that a request waits
+      for the other requests of its micro-batch
+    :arg max_queue: The maximum number of waiting requests
+    :arg workers: The number of processes used to encode a micro-batch
+
+    :type model: phonesis.impl.Tokenizer
+    :type max_batch: `int`
+    :type max_delay: `float`
+    :type max_queue: `int`
+    :type workers: `int`
+    """
+    def __init__(self, model, max_batch=64, max_delay=0.005, max_queue=1024,
+                 workers=1):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.workers = workers
+
+        self._queue = None
+        self._server = None
+        self._batcher = None
+        self._encoder = None
+        self._executor = None
+
+        self.n_requests = 0
+        self.n_texts = 0
+        self.n_batches = 0
+        self.n_rejected = 0
+        self.latencies = deque(maxlen=10000)
+        self.start_time = time.perf_counter()
+
+    def _ensure_started(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._encoder = BatchEncoder(
+            self.model, self.workers,
+            chunk_size=max(1, self.max_batch // max(1, self.workers))
+        )
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._batcher = asyncio.ensure_future(self._run_batches())
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """
+        Method to start listening on a TCP port, or on a Unix socket
+        if `path` is defined
+
+        :type host: `str`
+        :type port: `int`
+        :type path: `str`
+        """
+        self._ensure_started()
+        if path:
+            self._server = await asyncio.start_unix_server(
+                self._handle_client, path=path)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_client, host, port)
+        return self._server
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server else []
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+        if self._executor:
+            self._executor.shutdown()
+        if self._encoder:
+            self._encoder.close()
+
+    async def submit(self, texts):
+        """
+        Method to encode texts within the next micro-batch
+
+        :type texts: `list` of `str`
+        :rtype: `list` of `tuple`
+        :raises TypeError: When `texts` is not a `list` of `str`
+        :raises ServerOverloaded: When the queue of requests is full
+        """
+        if not isinstance(texts, list) \
+                or not all(isinstance(text, str) for text in texts):
+            raise TypeError("`texts` must be a list of strings.")
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((texts, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.n_rejected += 1
+            raise ServerOverloaded(
+                f"More than {self.max_queue} requests are waiting.")
+        return await future
+
+    async def _next_batch(self):
+        items = [await self._queue.get()]
+        size = len(items[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while size < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._next_batch()
+            texts = [text for item in items for text in item[0]]
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self._encoder.encode, texts)
+            except Exception:
+                # One request has failed, the others of the batch
+                # are encoded again one by one.
+                results = None
+
+            self.n_batches += 1
+            pos = 0
+            now = time.perf_counter()
+            for request_texts, future, received in items:
+                end = pos + len(request_texts)
+                if results is not None:
+                    result = results[pos:end]
+                else:
+                    try:
+                        result = await loop.run_in_executor(
+                            self._executor, self._encoder.encode,
+                            request_texts)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                        pos = end
+                        continue
+                if not future.done():
+                    future.set_result(result)
+                pos = end
+                self.n_requests += 1
+                self.n_texts += len(request_texts)
+                self.latencies.append(now - received)
+
+    def stats(self):
+        """
+        Method to get a snapshot of the statistics of the server,
+        the latencies are in milliseconds
+
+        :rtype: `dict`
+        """
+        elapsed = time.perf_counter() - self.start_time
+        latencies = list(self.latencies)
+        return dict(
+            requests=self.n_requests,
+            texts=self.n_texts,
+            batches=self.n_batches,
+            rejected=self.n_rejected,
+            queue=self._queue.qsize() if self._queue else 0,
+            p50_ms=1000 * percentile(latencies, 50),
+            p99_ms=1000 * percentile(latencies, 99),
+            requests_per_sec=self.n_requests / elapsed if elapsed else 0.0,
+            texts_per_sec=self.n_texts / elapsed if elapsed else 0.0,
+        )
+
+    async def _respond(self, request, writer):
+        response = dict(id=request.get('id'))
+        try:
+            if request.get('op') == 'stats':
+                response['stats'] = self.stats()
+            else:
+                texts = request.get('texts')
+                if texts is None:
+                    texts = [request.get('text', '')]
+                results = await self.submit(texts)
+                response['results'] = [
+                    dict(tokens=tokens, ids=ids, unknowns=unknowns)
+                    for tokens, ids, unknowns in results
+                ]
+        except Exception as e:
+            response['error'] = str(e)
+        writer.write(json.dumps(response).encode('utf-8') + b'\n')
+        await writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    writer.write(
+                        b'{"id": null, "error": "Invalid JSON request."}\n')
+                    continue
+                if not isinstance(request, dict):
+                    writer.write(
+                        b'{"id": null, "error": '
+                        b'"The request must be a JSON object."}\n')
+                    continue
+                task = asyncio.ensure_future(self._respond(request, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            logger.debug("Connection lost.")
+        finally:
+            writer.close()
+
+
+class TokenizerClient:
+    """
+    Asyncio client of the tokenization server, several requests can
+    be sent concurrently on the same connection
+    """
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+        self._pending = {}
+        self._next_id = 0
+        self._listener = None
+
+    async def connect(self, host='127.0.0.1', port=8765, path=None):
+        if path:
+            self._reader, self._writer = \
+                await asyncio.open_unix_connection(path)
+        else:
+            self._reader, self._writer = \
+                await asyncio.open_connection(host, port)
+        self._listener = asyncio.ensure_future(self._listen())
+        return self
+
+    async def _listen(self):
+        while line := await self._reader.readline():
+            response = json.loads(line)
+            future = self._pending.pop(response.get('id'), None)
+            if future and not future.done():
+                future.set_result(response)
+        for future in self._pending.values():
+            future.set_exception(ConnectionError("Connection closed."))
+
+    async def request(self, **data):
+        """
+        Method to send a request and wait for its response
+
+        :rtype: `dict`
+        """
+        self._next_id += 1
+        data['id'] = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+        self._writer.write(json.dumps(data).encode('utf-8') + b'\n')
+        await self._writer.drain()
+        response = await future
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    async def encode(self, texts):
+        """
+        Method to encode texts with the server
+
+        :type texts: `list` of `str`
+        :rtype: `list` of `dict`
+        """
+        response = await self.request(texts=texts)
+        return response['results']
+
+    async def stats(self):
+        response = await self.request(op='stats')
+        return response['stats']
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, ConnectionError):
+                pass
@@ -0,0 +1,100 @@
+from collections import Counter
+
+HISTOGRAM_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+
+
+class EncodeStats:
+    """
+    Counters of the encoding pipeline
+
+    The time spent in each stage (`preprocess`, `parse` and `lookup`)
+    is accumulated with its number of calls. The words, tokens and
+    unknown tokens are counted, and the numbers of tokens per word
+    and the word lengths are kept as histograms.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.texts = 0
+        self.words = 0
+        self.tokens = 0
+        self.unknown_tokens = 0
+        self.cache_hits = 0
+        self.tokens_per_word = Counter()
+        self.word_length = Counter()
+
+    def add_time(self, stage, seconds):
+        self.seconds[stage] += seconds
+        self.calls[stage] += 1
+
+    def add_word(self, word, indexes, cache_hit=False):
+        """
+        Method to count an encoded word, with its token ids
+        (the word boundary included)
+        """
+        n_tokens = len(indexes)
+        self.words += 1
+        self.tokens += n_tokens
+        self.unknown_tokens += sum(1 for i in indexes if i < 0)
+        self.cache_hits += cache_hit
+        self.tokens_per_word[n_tokens - 1] += 1
+        self.word_length[len(word)] += 1
+
+    def snapshot(self):
+        """
+        Method to get a copy of the counters
+
+        :rtype: `dict`
+        """
+        return dict(
+            stages={
+                stage: dict(calls=self.calls[stage],
+                            seconds=self.seconds[stage])
+                for stage in sorted(self.calls)
+            },
+            texts=self.texts,
+            words=self.words,
+            tokens=self.tokens,
+            unknown_tokens=self.unknown_tokens,
+            cache_hits=self.cache_hits,
+            tokens_per_word=dict(sorted(self.tokens_per_word.items())),
+            word_length=dict(sorted(self.word_length.items())),
+        )
+
+    def to_prometheus(self, prefix='phonesis'):
+        """
+        Method to dump the counters in the Prometheus text format
+
+        :type prefix: `str`
+        :rtype: `str`
+        """
+        lines = [
+            f"# TYPE {prefix}_stage_seconds_total counter",
+            *(f'{prefix}_stage_seconds_total{{stage="{stage}"}}'
+              f' {self.seconds[stage]:.9f}' for stage in sorted(self.calls)),
+            f"# TYPE {prefix}_stage_calls_total counter",
+            *(f'{prefix}_stage_calls_total{{stage="{stage}"}}'
+              f' {self.calls[stage]}' for stage in sorted(self.calls)),
+        ]
+        for name in ('texts', 'words', 'tokens', 'unknown_tokens',
+                     'cache_hits'):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {getattr(self, name)}")
+        for name in ('tokens_per_word', 'word_length'):
+            lines.extend(_histogram(f"{prefix}_{name}", getattr(self, name)))
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram(name, values):
+    lines = [f"# TYPE {name} histogram"]
+    for bound in HISTOGRAM_BUCKETS:
+        cumulated = sum(n for v, n in values.items() if v <= bound)
+        lines.append(f'{name}_bucket{{le="{bound}"}} {cumulated}')
+    count = sum(values.values())
+    lines.append(f'{name}_bucket{{le="+Inf"}} {count}')
+    lines.append(f"{name}_sum {sum(v * n for v, n in values.items())}")
+    lines.append(f"{name}_count {count}")
+    return lines
@@ -0,0 +1,310 @@
+import os
+import sys
+import mmap
+import struct
+import itertools
+from array import array
+
+from .batch import BatchEncoder
+
+INDEX_MAGIC = b'PHID'
+INDEX_VERSION = 1
+# magic, version, encoding, unknown id, number of documents
+INDEX_HEADER = struct.Struct('<4sBcxxQQ')
+OFFSET = struct.Struct('<Q')
+
+FIXED_WIDTHS = {'H': 2, 'I': 4}
+VARINT = 'V'
+
+
+def choose_encoding(vocab_size, varint=False):
+    """
+    Function to choose the encoding of the ids, given the vocab size
+
+    The ids are stored in the smallest unsigned fixed width which can
+    hold the vocab size, used as id of the unknown tokens.
+
+    :type vocab_size: `int`
+    :type varint: `bool`
+    :rtype: `str`
+    """
+    if varint:
+        return VARINT
+    if vocab_size < (1 << 16):
+        return 'H'
+    return 'I'
+
+
+def encode_varints(ids):
+    """
+    Function to encode unsigned ids as LEB128 variable length integers
+
+    :type ids: typing.Iterable[int]
+    :rtype: `bytes`
+    """
+    out = bytearray()
+    for value in ids:
+        while value > 0x7f:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varints(data):
+    """
+    Function to decode LEB128 variable length integers
+
+    :type data: `bytes`|`memoryview`
+    :rtype: array.array
+    """
+    out = array('I')
+    value = 0
+    shift = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        out.append(value)
+        value = 0
+        shift = 0
+    return out
+
+
+class IdStreamWriter:
+    """
+    Writer of the token ids of the documents into a packed binary file
+
+    Two files are written: `<prefix>.bin` which contains the ids of all
+    documents one after the other, in little-endian, and `<prefix>.idx`
+    which contains a header followed by the byte offsets of the documents
+    in `<prefix>.bin`. The unknown tokens are written with the id
+    `vocab_size`.
+
+    :arg prefix: The path of the output files without extension
+    :arg vocab_size: The size of the vocab of the tokenizer model
+    :arg varint: Write the ids as variable length integers
+
+    :type prefix: `str`
+    :type vocab_size: `int`
+    :type varint: `bool`
+    """
+    def __init__(self, prefix, vocab_size, varint=False):
+        self.prefix = prefix
+        self.unk_id = vocab_size
+        self.encoding = choose_encoding(vocab_size, varint)
+        self.n_docs = 0
+        self.n_ids = 0
+        self._offset = 0
+        self._data_file = open(prefix + '.bin', mode='wb')
+        self._index_file = open(prefix + '.idx', mode='wb')
+        self._write_header()
+        self._index_file.write(OFFSET.pack(0))
+
+    def _write_header(self):
+        self._index_file.write(INDEX_HEADER.pack(
+            INDEX_MAGIC, INDEX_VERSION, self.encoding.encode('ascii'),
+            self.unk_id, self.n_docs
+        ))
+
+    def write(self, ids):
+        """
+        Method to write the ids of one document
+
+        :type ids: typing.Sequence[int]
+        """
+        unk_id = self.unk_id
+        if ids and min(ids) < 0:
+            ids = [unk_id if i < 0 else i for i in ids]
+
+        if self.encoding == VARINT:
+            data = encode_varints(ids)
+        else:
+            values = array(self.encoding, ids)
+            if sys.byteorder != 'little':
+                values.byteswap()
+            data = values.tobytes()
+
+        self._data_file.write(data)
+        self._offset += len(data)
+        self._index_file.write(OFFSET.pack(self._offset))
+        self.n_docs += 1
+        self.n_ids += len(ids)
+
+    def close(self):
+        if self._data_file.closed:
+            return
+        self._data_file.close()
+        self._index_file.seek(0)
+        self._write_header()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class IdStreamReader:
+    """
+    Reader of the files written by `IdStreamWriter`
+
+    The data file is memory-mapped, the ids of a document are read
+    only when it is accessed.
+
+    :arg prefix: The path of the files without extension
+
+    :type prefix: `str`
+    """
+    def __init__(self, prefix):
+        with open(prefix + '.idx', mode='rb') as f:
+            header = f.read(INDEX_HEADER.size)
+            magic, version, encoding, unk_id, n_docs = \
+                INDEX_HEADER.unpack(header)
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{prefix}.idx is not an index of ids.")
+            if version != INDEX_VERSION:
+                raise ValueError(
+                    f"Version {version} of the index is not supported.")
+            offsets = array('Q')
+            offsets.frombytes(f.read(OFFSET.size * (n_docs + 1)))
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+
+        self.encoding = encoding.decode('ascii')
+        self.unk_id = unk_id
+        self.offsets = offsets
+        self._file = open(prefix + '.bin', mode='rb')
+        if offsets[-1]:
+            self._data = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = b''
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """
+        Method to get the ids of a document
+
+        :type index: `int`
+        :rtype: array.array
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Document index out of range.")
+        start = self.offsets[index]
+        end = self.offsets[index + 1]
+        data = self._data[start:end]
+        if self.encoding == VARINT:
+            return decode_varints(data)
+        values = array(self.encoding)
+        values.frombytes(data)
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_documents(file_path):
+    """
+    Function to read the documents of a text file, one per line,
+    without loading the whole file in memory
+
+    :type file_path: `str`
+    :rtype: typing.Generator[str]
+    """
+    with open(file_path, mode='r', encoding='utf-8') as file:
+        for line in file:
+            yield line.rstrip('\n')
+
+
+def _encode_documents(model, documents, workers, chunk_size, ids_only):
+    if workers <= 1:
+        encode = model.encode_ids if ids_only else model.encode
+        for document in documents:
+            yield encode(document)
+        return
+
+    with BatchEncoder(model, workers, chunk_size) as encoder:
+        encode = encoder.encode_ids if ids_only else encoder.encode
+        iterator = iter(documents)
+        while batch := list(itertools.islice(iterator,
+                                             workers * chunk_size)):
+            yield from encode(batch)
+
+
+def encode_stream(model, documents, workers=1, chunk_size=256):
+    """
+    Function to encode a stream of documents into arrays of ids
+
+    Only `workers * chunk_size` documents are held in memory at once.
+
+    :type model: phonesis.impl.Tokenizer
+    :type documents: typing.Iterable[str]
+    :type workers: `int`
+    :type chunk_size: `int`
+    :rtype: typing.Generator[array.array]
+    """
+    yield from _encode_documents(model, documents, workers, chunk_size,
+                                 ids_only=True)
+
+
+def encode_records(model, documents, workers=1, chunk_size=256):
+    """
+    Function to encode a stream of documents into their tokens, ids
+    and unknown words, as `Tokenizer.encode()` does, in order
+
+    Only `workers * chunk_size` documents are held in memory at once.
+
+    :type model: phonesis.impl.Tokenizer
+    :type documents: typing.Iterable[str]
+    :type workers: `int`
+    :type chunk_size: `int`
+    :rtype: typing.Generator[tuple]
+    """
+    yield from _encode_documents(model, documents, workers, chunk_size,
+                                 ids_only=False)
+
+
+def encode_file(model, input_path, prefix, varint=False, workers=1,
+                chunk_size=256):
+    """
+    Function to encode a text file into the packed binary id files
+    `<prefix>.bin` and `<prefix>.idx`, one document per line
+
+    :type model: phonesis.impl.Tokenizer
+    :type input_path: `str`
+    :type prefix: `str`
+    :type varint: `bool`
+    :type workers: `int`
+    :type chunk_size: `int`
+    :returns: The number of documents and the number of ids written
+    :rtype: `tuple` of `int`
+    """
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    documents = read_documents(input_path)
+    with IdStreamWriter(prefix, len(model.vocab), varint) as writer:
+        for ids in encode_stream(model, documents, workers, chunk_size):
+            writer.write(ids)
+    return writer.n_docs, writer.n_ids
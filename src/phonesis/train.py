@@ -1,6 +1,18 @@
+import os
+import sys
+import heapq
+import shutil
 import logging
-from .impl import Parser, Tokenizer, preprocess
-from .utils.pgit import PBM, ProgressBar
+import tempfile
+import itertools
+from zlib import crc32
+from collections import Counter, deque
+import concurrent.futures
+from .impl import Normalizer, Parser, Tokenizer
+from .trie import TrieParser, WORD_BOUNDARY
+from .batch import split_chunks
+from .reader import DictionaryReader, get_compression
+from .fs import write_json_codex, remove_delta
 
 logger = logging.getLogger(__name__)
 
@@ -14,20 +26,50 @@ class Trainer:
       of the language
     :arg vowels: The list of vowels used to build the words of the language
     :arg vocab: The set of existing token
+    :arg max_vocab: The maximum number of tokens of the vocab
+    :arg min_count: The minimum number of occurrences of a token
+      to keep it in the vocab
+    :arg order: The order of the ids of the tokens, `alphabetical`
+      or `frequency` (the most frequent tokens first)
+
+    When a budget (`max_vocab` or `min_count`) or the `frequency` order
+    is given, the vocab is rebuilt instead of being extended: the most
+    frequent tokens are kept with the word boundary and the letters of the
+    alphabet, and the pruned tokens are decomposed into the kept ones.
+    `remap` gives then the new ids of each token of the existing vocab.
 
     :type dataset: typing.Iterable[str]|typing.Generator[str]
     :type consonants: `list` of `str`
     :type vowels: `list` of `str`
     :type vocab: `list` of `str`
+    :type max_vocab: `int`
+    :type min_count: `int`
+    :type order: `str`
     """
-    def __init__(self, dataset, consonants, vowels, vocab=None):
+    ORDERS = ('alphabetical', 'frequency')
+
+    def __init__(self, dataset, consonants, vowels, vocab=None,
+                 max_vocab=None, min_count=1, order='alphabetical'):
+        if order not in self.ORDERS:
+            raise ValueError(f"Unknown order of the ids: {order}.")
         self.dataset = dataset
         self.consonants = consonants
         self.vowels = vowels
         self.vocab = vocab if vocab else []
+        self.max_vocab = max_vocab
+        self.min_count = min_count
+        self.order = order
+        self.remap = None
+        self.normalize = Normalizer(consonants, vowels)
         self.parse = Parser(consonants, vowels)
         self._model = None
 
+        self.counts = Counter()
+        self.new_tokens = []
+        self.n_pruned = 0
+        self.n_words = 0
+        self.n_tokens = 0
+
         # self.pbm = PBM()
         # self.pbar = ProgressBar()
         # self.pbar.bins = 100
@@ -45,29 +87,449 @@ class Trainer:
             self._model = Tokenizer(self.vocab, self.consonants, self.vowels)
         return self._model
 
-    def run(self):
-        new_tokens = []
-        for sample in self.dataset:
-            words = preprocess(sample, self.consonants, self.vowels)
-
-            for word in words:
-                if not word:
-                    continue
-                tokens = self.parse(word)
-                for token in tokens:
-                    if token in self.vocab:
-                        continue
-                    if token in new_tokens:
-                        continue
-                    new_tokens.append(token)
-                # self.pbar.step(1)
-
-        new_tokens.sort()
+    def count(self, words):
+        """
+        Method to count the occurrences of the tokens of the words
+
+        :type words: typing.Iterable[str]
+        """
+        counts = self.counts
+        normalize = self.normalize
+        parse = self.parse
+        for sample in words:
+            for word in normalize(sample):
+                tokens = parse(word)
+                counts.update(tokens)
+                self.n_words += 1
+                self.n_tokens += len(tokens)
+
+    @property
+    def compacts(self):
+        """
+        Whether the vocab is rebuilt from the counts of the tokens
+        instead of being extended
+
+        :rtype: `bool`
+        """
+        return (self.max_vocab is not None or self.min_count > 1
+                or self.order == 'frequency')
+
+    def update_vocab(self):
+        """
+        Method to append the new tokens counted to the vocab, sorted,
+        after the existing tokens, or to rebuild the vocab if it is
+        compacted
+
+        :returns: The number of new tokens
+        :rtype: `int`
+        """
+        if self.compacts:
+            return self.compact_vocab()
+        known = set(self.vocab)
+        new_tokens = sorted(t for t in self.counts if t not in known)
         self.vocab.extend(new_tokens)
+        self.new_tokens = new_tokens
+        return len(new_tokens)
+
+    def compact_vocab(self):
+        """
+        Method to rebuild the vocab from the most frequent tokens
+
+        :returns: The number of new tokens
+        :rtype: `int`
+        """
+        counts = self.counts
+        required = list(dict.fromkeys(
+            [WORD_BOUNDARY] + list(self.consonants) + list(self.vowels)))
+        if self.max_vocab is not None and self.max_vocab < len(required):
+            raise ValueError(
+                f"The vocab needs at least {len(required)} tokens,"
+                f" for the word boundary and the letters."
+            )
+        kept = set(required)
+        candidates = [t for t, c in counts.items()
+                      if c >= self.min_count and t not in kept]
+        candidates.sort(key=lambda t: (-counts[t], t))
+        if self.max_vocab is not None:
+            candidates = candidates[:self.max_vocab - len(required)]
+        kept.update(candidates)
 
-        vocab_size = len(new_tokens)
+        # The occurrences of a pruned token are given to its parts.
+        decompose = TrieParser(required + candidates, 'optimal')
+        frequencies = Counter({t: counts[t] for t in kept})
+        for token, count in counts.items():
+            if token not in kept:
+                for piece in decompose.split(token):
+                    frequencies[piece] += count
+
+        if self.order == 'frequency':
+            vocab = sorted(kept, key=lambda t: (-frequencies[t], t))
+        else:
+            vocab = sorted(kept)
+        old_vocab = self.vocab
+        token_ids = {t: i for i, t in enumerate(vocab)}
+        self.remap = [
+            [token_ids.get(piece, -1) for piece in decompose.split(token)]
+            if token != WORD_BOUNDARY else [token_ids[token]]
+            for token in old_vocab
+        ]
+        old_tokens = set(old_vocab)
+        self.new_tokens = [t for t in vocab if t not in old_tokens]
+        self.n_pruned = sum(1 for t in counts if t not in kept)
+        self.vocab = vocab
+        self._model = None
+        return len(self.new_tokens)
+
+    def run(self):
+        self.count(self.dataset)
+        vocab_size = self.update_vocab()
         logger.info(
             f"Training process is done in " + "{progressbar_duration}."
             f" {vocab_size} tokens are found."
         )
+        logger.info(
+            f"{self.n_words} words processed, {self.n_tokens} tokens seen,"
+            f" {len(self.counts)} unique tokens."
+        )
+        if self.compacts:
+            logger.info(
+                f"{len(self.vocab)} tokens kept, {self.n_pruned} pruned."
+            )
         return vocab_size
+
+
+def shard_ranges(file_path, n_shards):
+    """
+    Function to split a file into byte ranges of about the same size
+
+    :type file_path: `str`
+    :type n_shards: `int`
+    :rtype: `list` of `tuple`
+    """
+    size = os.path.getsize(file_path)
+    n_shards = max(1, min(n_shards, size))
+    bounds = [size * i // n_shards for i in range(n_shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _count_shard(args):
+    file_path, start, end, consonants, vowels, options = args
+    trainer = Trainer(None, consonants, vowels)
+    trainer.count(DictionaryReader(file_path, start=start, end=end,
+                                   **options))
+    return trainer.counts, trainer.n_words, trainer.n_tokens
+
+
+def _partition_words(file_paths, index, n_partitions, options):
+    seen = set()
+    for file_path in file_paths:
+        for word in DictionaryReader(file_path, **options):
+            if crc32(word.encode('utf-8')) % n_partitions != index:
+                continue
+            if word in seen:
+                continue
+            seen.add(word)
+            yield word
+
+
+def _count_partition(args):
+    file_paths, index, n_partitions, consonants, vowels, options = args
+    trainer = Trainer(None, consonants, vowels)
+    trainer.count(_partition_words(file_paths, index, n_partitions,
+                                   options))
+    return trainer.counts, trainer.n_words, trainer.n_tokens
+
+
+def _count_words(args):
+    words, consonants, vowels = args
+    trainer = Trainer(None, consonants, vowels)
+    trainer.count(words)
+    return trainer.counts, trainer.n_words, trainer.n_tokens
+
+
+class ShardedTrainer(Trainer):
+    """
+    Training process which splits the words of the dictionary files
+    between several processes, which parse them in parallel
+
+    The counts of the shards are merged, so the vocab is the same as
+    the one of `Trainer` on the whole dictionary. A compressed dictionary
+    can not be split, so it is read by the main process which sends
+    chunks of words to the others.
+
+    When the words are de-duplicated (`dedup` reader option, the default),
+    a word must be counted once whatever the shard or the file where it is
+    found. So each process reads all the files, and only parses the words
+    whose hash falls into its partition: the same word is always parsed,
+    and de-duplicated, by the same process. Otherwise, each process
+    parses its own byte range of a plain file.
+
+    :arg dataset: The paths to the dictionary files, one word per line
+    :arg consonants: The list of consonants used to build the words
+      of the language
+    :arg vowels: The list of vowels used to build the words of the language
+    :arg vocab: The set of existing token
+    :arg workers: The number of processes, the number of CPUs
+      if it is not defined
+    :arg reader_options: The options of the `DictionaryReader`
+      of the dictionary files (`column`, `sep`, `dedup`, ...)
+    :arg max_vocab: The maximum number of tokens of the vocab
+    :arg min_count: The minimum number of occurrences of a token
+    :arg order: The order of the ids, `alphabetical` or `frequency`
+
+    :type dataset: `str`|`list` of `str`
+    :type consonants: `list` of `str`
+    :type vowels: `list` of `str`
+    :type vocab: `list` of `str`
+    :type workers: `int`
+    :type reader_options: `dict`
+    :type max_vocab: `int`
+    :type min_count: `int`
+    :type order: `str`
+    """
+    def __init__(self, dataset, consonants, vowels, vocab=None,
+                 workers=None, reader_options=None, max_vocab=None,
+                 min_count=1, order='alphabetical'):
+        super().__init__(dataset, consonants, vowels, vocab,
+                         max_vocab, min_count, order)
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.reader_options = reader_options if reader_options else {}
+
+    def _merge(self, results):
+        for counts, n_words, n_tokens in results:
+            self.counts.update(counts)
+            self.n_words += n_words
+            self.n_tokens += n_tokens
+
+    def _partition_tasks(self, file_paths):
+        options = dict(self.reader_options)
+        options.pop('progress', None)
+        options['dedup'] = False
+        for index in range(self.workers):
+            yield _count_partition, (file_paths, index, self.workers,
+                                     self.consonants, self.vowels, options)
+
+    def _tasks(self, file_path):
+        if get_compression(file_path):
+            reader = DictionaryReader(file_path, **self.reader_options)
+            for words in split_chunks(reader, 65536):
+                yield _count_words, (words, self.consonants, self.vowels)
+            return
+
+        options = dict(self.reader_options)
+        options.pop('progress', None)
+        for start, end in shard_ranges(file_path, self.workers):
+            yield _count_shard, (file_path, start, end, self.consonants,
+                                 self.vowels, options)
+
+    def count(self, file_paths):
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        if self.reader_options.get('dedup', True):
+            tasks = self._partition_tasks(list(file_paths))
+        else:
+            tasks = itertools.chain.from_iterable(
+                self._tasks(file_path) for file_path in file_paths)
+        # Only a few tasks are pending at once, to bound the memory
+        # used by the chunks of words of the compressed dictionaries.
+        pending = deque()
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers) as executor:
+            for function, args in tasks:
+                pending.append(executor.submit(function, args))
+                if len(pending) > 2 * self.workers:
+                    self._merge([pending.popleft().result()])
+            self._merge(future.result() for future in pending)
+
+
+def _read_run(file_path):
+    with open(file_path, mode='r', encoding='utf-8') as f:
+        for line in f:
+            token, count = line.rstrip('\n').split('\t')
+            yield token, int(count)
+
+
+def merge_counts(runs):
+    """
+    Function to merge sorted runs of token counts, summing the counts
+    of a token found in several runs
+
+    :type runs: `list` of typing.Iterable[tuple]
+    :returns: The tokens and their counts, sorted by token
+    :rtype: typing.Generator[tuple]
+    """
+    merged = heapq.merge(*runs)
+    for token, group in itertools.groupby(merged, key=lambda e: e[0]):
+        yield token, sum(count for _, count in group)
+
+
+class ExternalTrainer(Trainer):
+    """
+    Training process whose memory is bounded, for the dictionaries
+    whose tokens do not fit in memory
+
+    The tokens are counted until the estimated size of the counts reaches
+    `memory_limit`. Then the counts are written, sorted, into a temporary
+    run file. At the end, the runs are merged and the vocab is written
+    into the codex file as it is produced: the existing tokens first, then
+    the new tokens sorted, as `Trainer` does. The new tokens are counted
+    (`n_new`) but not kept, so load the codex written to use it.
+
+    :arg dataset: The dataset containing the words of the langauge
+    :arg consonants: The list of consonants used to build the words
+      of the language
+    :arg vowels: The list of vowels used to build the words of the language
+    :arg output: The path to the JSON codex file written
+    :arg vocab: The set of existing token
+    :arg memory_limit: The maximum size of the counts in memory, in bytes
+    :arg min_count: The minimum number of occurrences of a new token
+      to add it to the vocab
+    :arg tmp_dir: The directory of the run files, the default temporary
+      directory if it is not defined
+
+    :type dataset: typing.Iterable[str]|typing.Generator[str]
+    :type consonants: `list` of `str`
+    :type vowels: `list` of `str`
+    :type output: `str`
+    :type vocab: `list` of `str`
+    :type memory_limit: `int`
+    :type min_count: `int`
+    :type tmp_dir: `str`
+    """
+    # The estimated size of an entry of the counts, without its token,
+    # and of its reference in the sorted list of the tokens of a spill.
+    ENTRY_SIZE = 108
+    # The maximum number of run files merged at once.
+    MAX_OPEN_RUNS = 256
+
+    def __init__(self, dataset, consonants, vowels, output, vocab=None,
+                 memory_limit=1 << 30, min_count=1, tmp_dir=None):
+        super().__init__(dataset, consonants, vowels, vocab)
+        self.output = output
+        self.memory_limit = memory_limit
+        self.min_count = min_count
+        self.tmp_dir = tmp_dir
+        self.runs = []
+        self.n_runs = 0
+        self.n_unique = 0
+        self.n_new = 0
+        self._run_dir = None
+        self._size = 0
+
+    @property
+    def compacts(self):
+        return False
+
+    def count(self, words):
+        counts = self.counts
+        normalize = self.normalize
+        parse = self.parse
+        getsizeof = sys.getsizeof
+        entry_size = self.ENTRY_SIZE
+        for sample in words:
+            for word in normalize(sample):
+                tokens = parse(word)
+                for token in tokens:
+                    if token in counts:
+                        counts[token] += 1
+                    else:
+                        counts[token] = 1
+                        self._size += getsizeof(token) + entry_size
+                self.n_words += 1
+                self.n_tokens += len(tokens)
+                if self._size >= self.memory_limit:
+                    self.spill()
+
+    def _new_run(self):
+        if self._run_dir is None:
+            self._run_dir = tempfile.mkdtemp(prefix='phonesis-runs-',
+                                             dir=self.tmp_dir)
+        file_path = os.path.join(self._run_dir, f"{self.n_runs}.tsv")
+        self.runs.append(file_path)
+        self.n_runs += 1
+        return file_path
+
+    def _write_run(self, entries):
+        with open(self._new_run(), mode='w', encoding='utf-8') as f:
+            f.writelines(f"{token}\t{count}\n" for token, count in entries)
+
+    def spill(self):
+        """
+        Method to write the counts, sorted by token, into a new run file
+        and to free them
+        """
+        if not self.counts:
+            return
+        # Only the tokens are sorted, not the pairs of the counts, so
+        # the memory used stays within the limit while the run is written.
+        counts = self.counts
+        self._write_run((token, counts[token]) for token in sorted(counts))
+        logger.debug(f"{len(self.counts)} token counts written"
+                     f" into the run {self.n_runs}.")
+        self.counts.clear()
+        self._size = 0
+
+    def merged_counts(self):
+        """
+        Method to merge the runs and the counts in memory
+
+        The runs are merged by groups of `MAX_OPEN_RUNS` files
+        until there are few enough of them to be opened at once.
+
+        :returns: The tokens and their counts, sorted by token
+        :rtype: typing.Generator[tuple]
+        """
+        self.spill()
+        while len(self.runs) > self.MAX_OPEN_RUNS:
+            group = self.runs[:self.MAX_OPEN_RUNS]
+            del self.runs[:self.MAX_OPEN_RUNS]
+            self._write_run(merge_counts([_read_run(f) for f in group]))
+            for file_path in group:
+                os.remove(file_path)
+        yield from merge_counts([_read_run(f) for f in self.runs])
+
+    def iter_vocab(self):
+        """
+        Method to produce the tokens of the vocab, the existing tokens
+        first and then the new tokens sorted
+
+        :rtype: typing.Generator[str]
+        """
+        yield from self.vocab
+        known = set(self.vocab)
+        for token, count in self.merged_counts():
+            self.n_unique += 1
+            if count >= self.min_count and token not in known:
+                self.n_new += 1
+                yield token
+
+    def cleanup(self):
+        """
+        Method to remove the run files
+        """
+        if self._run_dir is not None:
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+            self._run_dir = None
+        self.runs = []
+
+    def run(self):
+        """
+        Method to count the tokens of the dataset and to write
+        the codex file
+
+        :returns: The number of new tokens
+        :rtype: `int`
+        """
+        try:
+            self.count(self.dataset)
+            n_vocab = write_json_codex(self.output, self.consonants,
+                                       self.vowels, self.iter_vocab())
+        finally:
+            self.cleanup()
+        remove_delta(self.output)
+        logger.info(
+            f"{self.n_words} words processed, {self.n_tokens} tokens seen,"
+            f" {self.n_unique} unique tokens, merged from {self.n_runs} runs."
+        )
+        logger.info(f"{n_vocab} tokens written into {self.output}.")
+        return self.n_new
@@ -0,0 +1,232 @@
+import time
+from array import array
+from collections import deque
+
+from .stats import EncodeStats
+
+WORD_BOUNDARY = '#'
+
+
+class VocabTrie:
+    """
+    Prefix trie of the tokens of a vocab, stored in flat arrays
+
+    The nodes are numbered in breadth-first order, so the children of
+    a node are contiguous: the labels of the edges of the node `n` are
+    `labels[first[n]:first[n + 1]]`, one letter per edge in a single
+    `str`, and `children` holds the node of each edge at the same index.
+    The id of the token which ends on each node (-1 if none) is stored
+    in an `array`. The first id of a token is kept.
+
+    :arg vocab: The list of tokens
+    :type vocab: typing.Iterable[str]
+    """
+    def __init__(self, vocab):
+        # The tokens are sorted, so the tokens of the subtree of a node
+        # are a range of them, the ones which end on the node first.
+        entries = sorted((token, index) for index, token in enumerate(vocab)
+                         if token and token != WORD_BOUNDARY)
+        tokens = [token for token, _ in entries]
+        ids = array('i')
+        first = array('i')
+        children = array('i')
+        labels = []
+        pending = deque([(0, len(tokens), 0)])
+        while pending:
+            lo, hi, depth = pending.popleft()
+            index = -1
+            while lo < hi and len(tokens[lo]) == depth:
+                if index < 0:
+                    index = entries[lo][1]
+                lo += 1
+            ids.append(index)
+            first.append(len(labels))
+            while lo < hi:
+                letter = tokens[lo][depth]
+                end = lo + 1
+                while end < hi and tokens[end][depth] == letter:
+                    end += 1
+                labels.append(letter)
+                children.append(len(ids) + len(pending))
+                pending.append((lo, end, depth + 1))
+                lo = end
+        first.append(len(labels))
+
+        self._labels = ''.join(labels)
+        self._first = first
+        self._children = children
+        self._ids = ids
+        self.max_length = max(map(len, tokens), default=0)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def matches(self, word, start):
+        """
+        Method to find the tokens which start at a position of a word
+
+        :type word: `str`
+        :type start: `int`
+        :returns: The end positions of the tokens found, shortest first
+        :rtype: `list` of `int`
+        """
+        find = self._labels.find
+        first = self._first
+        children = self._children
+        ids = self._ids
+        node = 0
+        ends = []
+        # No token is longer than `max_length`, and the word
+        # is read in place.
+        for pos in range(start, min(len(word), start + self.max_length)):
+            edge = find(word[pos], first[node], first[node + 1])
+            if edge < 0:
+                break
+            node = children[edge]
+            if ids[node] >= 0:
+                ends.append(pos + 1)
+        return ends
+
+    def longest_match(self, word, start):
+        """
+        Method to find the end of the longest token which starts
+        at a position of a word, 0 if there is none
+
+        :type word: `str`
+        :type start: `int`
+        :rtype: `int`
+        """
+        find = self._labels.find
+        first = self._first
+        children = self._children
+        ids = self._ids
+        node = 0
+        end = 0
+        for pos in range(start, min(len(word), start + self.max_length)):
+            edge = find(word[pos], first[node], first[node + 1])
+            if edge < 0:
+                break
+            node = children[edge]
+            if ids[node] >= 0:
+                end = pos + 1
+        return end
+
+
+class TrieParser:
+    """
+    Parser which splits the words into tokens of the vocab
+
+    With the `greedy` mode, the longest token of the vocab is taken at
+    each position. With the `optimal` mode, the word is split into the
+    fewest tokens. A letter which starts no token of the vocab becomes
+    a token on its own (the only tokens which can be unknown), and the
+    `optimal` mode makes as few of them as possible. The parsing time
+    is linear in the word length.
+
+    :arg vocab: The list of tokens
+    :arg mode: `greedy` or `optimal`
+
+    :type vocab: typing.Iterable[str]
+    :type mode: `str`
+    """
+    MODES = ('greedy', 'optimal')
+
+    def __init__(self, vocab, mode='greedy'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown segmentation mode: {mode}.")
+        self.mode = mode
+        self.trie = VocabTrie(vocab if vocab else [])
+        self.stats = None
+
+    def _greedy_ends(self, word):
+        ends = []
+        start = 0
+        while start < len(word):
+            end = self.trie.longest_match(word, start)
+            start = end if end else start + 1
+            ends.append(start)
+        return ends
+
+    def _optimal_ends(self, word):
+        size = len(word)
+        # An unknown letter costs more than any number of known tokens.
+        unknown_cost = size + 1
+        # The costs are computed from the end of the word, so that among
+        # the splits with the fewest tokens, the longest tokens come first.
+        costs = [0] * (size + 1)
+        following = [size] * (size + 1)
+        for start in range(size - 1, -1, -1):
+            best = costs[start + 1] + unknown_cost
+            best_end = start + 1
+            for end in reversed(self.trie.matches(word, start)):
+                if costs[end] + 1 < best:
+                    best = costs[end] + 1
+                    best_end = end
+            costs[start] = best
+            following[start] = best_end
+
+        ends = []
+        start = 0
+        while start < size:
+            start = following[start]
+            ends.append(start)
+        return ends
+
+    def split_positions(self, word):
+        """
+        Method to get the end position of each token of a word
+
+        :type word: `str`
+        :rtype: `list` of `int`
+        """
+        if self.mode == 'greedy':
+            return self._greedy_ends(word)
+        return self._optimal_ends(word)
+
+    def split_words(self, words):
+        """
+        Method to get the end position of each token of several words
+
+        :type words: `list` of `str`
+        :rtype: `list` of `list`
+        """
+        return list(map(self.split_positions, words))
+
+    def split(self, word):
+        """
+        Method to split a word, or a token, into tokens of the vocab,
+        without the word boundary
+
+        :type word: `str`
+        :rtype: `list` of `str`
+        """
+        tokens = []
+        start = 0
+        for end in self.split_positions(word):
+            tokens.append(word[start:end])
+            start = end
+        return tokens
+
+    def make_parsing(self, word):
+        assert word is not None, "Word is None, must be a string."
+        tokens = self.split(word)
+        tokens.append(WORD_BOUNDARY)
+        return tokens
+
+    def _make_parsing_timed(self, word):
+        start = time.perf_counter()
+        tokens = TrieParser.make_parsing(self, word)
+        self.stats.add_time('parse', time.perf_counter() - start)
+        return tokens
+
+    def enable_stats(self, stats=None):
+        self.stats = stats if stats is not None else EncodeStats()
+        self.make_parsing = self._make_parsing_timed
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+        self.__dict__.pop('make_parsing', None)
+
+    def __call__(self, word):
+        return self.make_parsing(word)
@@ -0,0 +1,387 @@
+"""
+Micro-benchmarks of the encoding pipeline
+
+Run them from the root of the repository with `make bench`, or:
+
+    python -m tests.benchmarks --baseline tests/bench_baseline.json
+
+Each benchmark reports the best time of one operation, in seconds,
+over several repeats. The results are written in JSON, and compared
+to the baseline: a benchmark slower than its baseline time multiplied
+by `1 + tolerance` is a regression, and the exit status is 1.
+The baseline file can set a tolerance per benchmark in its
+`tolerances` entry, and bound a benchmark by another one of the same
+run in its `relative` entry: `{"a": ["b", 2.0]}` is a regression when
+`a` is more than 2 times slower than `b`, whatever the machine.
+Use `--update-baseline` to write the results as the new baseline.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import subprocess
+from argparse import ArgumentParser
+
+import phonesis
+from phonesis.impl import Normalizer, Parser, Tokenizer
+from phonesis.trie import TrieParser
+
+FR_CODEX = 'samples/fr_phsis_built.json'
+EN_CODEX = 'samples/en_phsis_built.json'
+FR_DICTIONARY = 'samples/fr/small_dico.txt'
+FR_ALPHABET = 'samples/fr/alphabet.json'
+
+SHORT_WORD = "bon"
+LONG_WORD = "anticonstitutionnellement"
+PARAGRAPH = (
+    "Each Machine Learning Crash Course module is self-contained,"
+    " so if you have prior experience in machine learning, you can skip"
+    " directly to the topics you want to learn. If you're new to machine"
+    " learning, we recommend completing modules in the order below."
+)
+
+BENCHMARKS = {}
+
+
+def benchmark(name, number=1):
+    """
+    Decorator to register a benchmark. The decorated function prepares
+    the data and returns the function to time, which is called
+    `number` times per repeat.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, number)
+        return setup
+    return register
+
+
+def load_model(file_path, **kwargs):
+    model = Tokenizer(**kwargs)
+    model.load(file_path)
+    return model
+
+
+def read_dictionary():
+    with open(FR_DICTIONARY, mode='r', encoding='utf-8') as f:
+        return [w for line in f for w in line.split()[:1]]
+
+
+@benchmark('preprocess.word', number=10000)
+def bench_preprocess_word(context):
+    normalize = Normalizer()
+    return lambda: normalize(LONG_WORD)
+
+
+@benchmark('preprocess.paragraph', number=1000)
+def bench_preprocess_paragraph(context):
+    normalize = Normalizer()
+    return lambda: normalize(PARAGRAPH)
+
+
+@benchmark('parse.short_word', number=10000)
+def bench_parse_short_word(context):
+    parse = Parser()
+    return lambda: parse.make_parsing(SHORT_WORD)
+
+
+@benchmark('parse.long_word', number=10000)
+def bench_parse_long_word(context):
+    parse = Parser()
+    return lambda: parse.make_parsing(LONG_WORD)
+
+
+@benchmark('parse.dictionary')
+def bench_parse_dictionary(context):
+    model = context['fr']
+    words = [w for line in read_dictionary() for w in model.normalize(line)]
+    parse = model.parse
+
+    def run():
+        for word in words:
+            parse(word)
+    return run
+
+
+@benchmark('trie.greedy.long_word', number=10000)
+def bench_trie_greedy_long_word(context):
+    parse = TrieParser(context['fr'].vocab, 'greedy')
+    return lambda: parse.make_parsing(LONG_WORD)
+
+
+@benchmark('trie.optimal.long_word', number=10000)
+def bench_trie_optimal_long_word(context):
+    parse = TrieParser(context['fr'].vocab, 'optimal')
+    return lambda: parse.make_parsing(LONG_WORD)
+
+
+@benchmark('encode.fr.word', number=10000)
+def bench_encode_fr_word(context):
+    model = context['fr']
+    return lambda: model.encode(LONG_WORD)
+
+
+@benchmark('encode.en.word', number=10000)
+def bench_encode_en_word(context):
+    model = context['en']
+    return lambda: model.encode(LONG_WORD)
+
+
+@benchmark('encode.en.paragraph', number=1000)
+def bench_encode_en_paragraph(context):
+    model = context['en']
+    return lambda: model.encode(PARAGRAPH)
+
+
+@benchmark('encode.en.paragraph_cached', number=1000)
+def bench_encode_en_paragraph_cached(context):
+    model = load_model(EN_CODEX, cache_size=4096)
+    return lambda: model.encode(PARAGRAPH)
+
+
+@benchmark('encode.en.paragraph_binary', number=1000)
+def bench_encode_en_paragraph_binary(context):
+    file_path = os.path.join(context['tmp_dir'], 'en_encode.phsx')
+    context['en'].save(file_path)
+    model = load_model(file_path)
+    return lambda: model.encode(PARAGRAPH)
+
+
+@benchmark('encode.en.paragraph_spans', number=1000)
+def bench_encode_en_paragraph_spans(context):
+    model = context['en']
+    return lambda: model.encode_spans(PARAGRAPH)
+
+
+@benchmark('forward.en.batch', number=10)
+def bench_forward_en_batch(context):
+    model = context['en']
+    texts = [PARAGRAPH] * 100
+    return lambda: model.forward(texts)
+
+
+@benchmark('decode.en.batch', number=10)
+def bench_decode_en_batch(context):
+    model = context['en']
+    batch = [model.encode_ids(PARAGRAPH).tolist()] * 100
+    return lambda: model.decode_batch(batch)
+
+
+@benchmark('load.json.fr', number=10)
+def bench_load_json_fr(context):
+    return lambda: load_model(FR_CODEX)
+
+
+@benchmark('load.json.en', number=10)
+def bench_load_json_en(context):
+    return lambda: load_model(EN_CODEX)
+
+
+@benchmark('load.binary.en', number=10)
+def bench_load_binary_en(context):
+    file_path = os.path.join(context['tmp_dir'], 'en.phsx')
+    context['en'].save(file_path)
+    return lambda: load_model(file_path)
+
+
+def compare_engines(codex=FR_CODEX, dictionary=FR_DICTIONARY):
+    """
+    Function to compare the segmentation engines on the words
+    of a dictionary
+
+    :returns: The tokens per word and the rate of unknown tokens
+      of each engine
+    :rtype: `dict`
+    """
+    model = load_model(codex)
+    with open(dictionary, mode='r', encoding='utf-8') as f:
+        words = [w for line in f for w in model.normalize(line)]
+    report = {}
+    for engine in Tokenizer.ENGINES:
+        model.engine = engine
+        n_tokens = 0
+        n_unknowns = 0
+        for word in words:
+            indexes = model.encode_word(word)[1]
+            # The word boundary is not counted.
+            n_tokens += len(indexes) - 1
+            n_unknowns += indexes.count(-1)
+        report[engine] = dict(
+            tokens_per_word=n_tokens / max(len(words), 1),
+            unknown_rate=n_unknowns / max(n_tokens, 1),
+        )
+        print(f"{engine:10s} {report[engine]['tokens_per_word']:8.3f}"
+              f" tokens/word {100 * report[engine]['unknown_rate']:8.3f}%"
+              f" unknown")
+    return report
+
+
+def command(function, *args, cwd=None, stdin=None):
+    """
+    Function to get a function which runs a command of `phonesis.main`
+    in a new interpreter, as its console script does
+    """
+    source_dir = os.path.dirname(os.path.dirname(phonesis.__file__))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        p for p in (source_dir, env.get('PYTHONPATH')) if p)
+    code = f"import sys; sys.argv[1:] = {list(args)!r}; "
+    code += f"from phonesis.main import {function}"
+    if args:
+        code += f"; {function}()"
+
+    def run():
+        subprocess.run([sys.executable, '-c', code, *args], input=stdin,
+                       cwd=cwd, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return run
+
+
+@benchmark('cli.inference.import')
+def bench_cli_inference_import(context):
+    return command('inference')
+
+
+@benchmark('cli.inference.first_token')
+def bench_cli_inference_first_token(context):
+    codex = os.path.abspath(EN_CODEX)
+    return command('inference', '-m', codex, stdin=b"Machine\n")
+
+
+@benchmark('cli.train.import')
+def bench_cli_train_import(context):
+    return command('train')
+
+
+@benchmark('cli.train.first_token')
+def bench_cli_train_first_token(context):
+    tmp_dir = context['tmp_dir']
+    dictionary = os.path.join(tmp_dir, 'words.txt')
+    with open(dictionary, mode='w', encoding='utf-8') as f:
+        f.write("machine\n")
+    return command('train', '-a', os.path.abspath(FR_ALPHABET),
+                   '-d', dictionary, '-o', 'words.json', cwd=tmp_dir)
+
+
+def measure(run, number, repeat):
+    """
+    Function to get the best time of one call of `run`
+
+    :rtype: `float`
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def run_benchmarks(pattern=None, repeat=5):
+    """
+    Function to run the benchmarks whose names match `pattern`
+
+    :rtype: `dict`
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='phonesis-bench-')
+    context = dict(fr=load_model(FR_CODEX), en=load_model(EN_CODEX),
+                   tmp_dir=tmp_dir)
+    results = {}
+    try:
+        for name, (setup, number) in BENCHMARKS.items():
+            if pattern and not re.search(pattern, name):
+                continue
+            results[name] = measure(setup(context), number, repeat)
+            print(f"{name:32s} {results[name] * 1e6:12.2f} us")
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Function to find the benchmarks slower than their baseline
+
+    :returns: The names of the regressed benchmarks
+    :rtype: `list` of `str`
+    """
+    tolerances = baseline.get('tolerances', {})
+    regressions = []
+    for name, value in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if not reference:
+            continue
+        limit = reference * (1 + tolerances.get(name, tolerance))
+        ratio = value / reference
+        status = 'REGRESSION' if value > limit else 'ok'
+        print(f"{name:32s} x{ratio:6.2f} {status}")
+        if value > limit:
+            regressions.append(name)
+    for name, (other, factor) in baseline.get('relative', {}).items():
+        if name not in results or other not in results:
+            continue
+        ratio = results[name] / results[other]
+        status = 'REGRESSION' if ratio > factor else 'ok'
+        print(f"{name:32s} x{ratio:6.2f} of {other} {status}")
+        if ratio > factor and name not in regressions:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog="Phonesis benchmarks")
+    parser.add_argument('-o', '--output', default='bench_results.json',
+                        help="The JSON file where the results are written.")
+    parser.add_argument('-b', '--baseline',
+                        help="The JSON file of the baseline results.")
+    parser.add_argument('-t', '--tolerance', type=float, default=0.5,
+                        help="The default relative slow down tolerated.")
+    parser.add_argument('-k', '--pattern',
+                        help="Run only the benchmarks matching a pattern.")
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="Write the results into the baseline file.")
+    parser.add_argument('--engines', action='store_true',
+                        help="Compare the tokens per word of the engines.")
+    args = parser.parse_args(argv)
+
+    if args.engines:
+        compare_engines()
+        return 0
+
+    results = run_benchmarks(args.pattern, args.repeat)
+    report = dict(
+        python=platform.python_version(),
+        machine=platform.machine(),
+        results=results,
+    )
+    with open(args.output, mode='w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    if args.update_baseline:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, mode='r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update(report)
+        with open(args.baseline, mode='w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        return 0
+
+    with open(args.baseline, mode='r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"ERRO: {len(regressions)} benchmarks regressed.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
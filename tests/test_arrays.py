@@ -0,0 +1,66 @@
+import pytest
+from phonesis.impl import Tokenizer
+
+np = pytest.importorskip('numpy')
+
+FR_CODEX = 'samples/fr_phsis_built.json'
+TEXTS = ["Verbalement", "Arnold boxes", "", "Function verbalement arnold"]
+
+
+def test_padded_matrix():
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    expected = [model.encode(text)[1] for text in TEXTS]
+    pad_id = len(model.vocab)
+
+    batch = model.encode_arrays(TEXTS)
+    assert batch.ids.dtype == np.int32
+    assert batch.ids.shape == (4, max(map(len, expected)))
+    assert batch.lengths.tolist() == list(map(len, expected))
+    for row, ids in zip(batch.ids.tolist(), expected):
+        assert row == ids + [pad_id] * (len(row) - len(ids))
+    assert batch.attention_mask.sum(axis=1).tolist() == \
+        batch.lengths.tolist()
+
+    batch = model.encode_arrays(TEXTS, max_length=4, pad_id=-2)
+    assert batch.ids.tolist()[3] == expected[3][:4]
+    assert batch.ids.tolist()[2] == [-2] * 4
+    with pytest.raises(ValueError):
+        model.encode_arrays(TEXTS, max_length=4, truncation=False)
+
+    batch = model.encode_arrays(TEXTS, boundaries=False)
+    boundary_id = model.token_to_id('#')
+    assert batch.lengths.tolist() == \
+        [len([i for i in ids if i != boundary_id]) for ids in expected]
+
+
+def test_buckets():
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    batches = model.encode_buckets(TEXTS, batch_size=2)
+    assert [b.indices.tolist() for b in batches] == [[2, 0], [1, 3]]
+    assert batches[0].ids.shape == (2, 6)
+    full = model.encode_arrays(TEXTS)
+    row = batches[1].ids[1]
+    assert row.tolist() == full.ids[3][:len(row)].tolist()
+
+
+def test_unknown_ids():
+    model = Tokenizer(['#', 'bon'])
+    batch = model.encode_arrays(["bonjour bon", "bon"])
+    assert batch.ids.tolist() == [[1, 3, 0, 1, 0], [1, 0, 2, 2, 2]]
+    assert batch.attention_mask.tolist() == \
+        [[1, 1, 1, 1, 1], [1, 1, 0, 0, 0]]
+    batch = model.encode_arrays(["bonjour bon"], unk_id=-1)
+    assert batch.ids.tolist() == [[1, -1, 0, 1, 0]]
+    batches = model.encode_buckets(["bonjour"], batch_size=2, unk_id=7)
+    assert batches[0].ids.tolist() == [[1, 7, 0]]
+
+def test_decode_arrays():
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    batch = model.encode_arrays(TEXTS)
+    expected = [' '.join(model.normalize(text)) for text in TEXTS]
+    assert model.decode_batch(batch.ids, pad_id=len(model.vocab)) == \
+        expected
+    assert model.decode(batch.ids[0], on_unknown="skip") == expected[0]
@@ -0,0 +1,25 @@
+from tests.benchmarks import compare, compare_engines, run_benchmarks
+
+
+def test_compare_with_baseline():
+    baseline = dict(results={'a': 1.0, 'b': 1.0}, tolerances={'b': 2.0})
+    assert compare({'a': 1.2, 'b': 2.5, 'c': 9.0}, baseline, 0.5) == []
+    assert compare({'a': 1.6, 'b': 3.5}, baseline, 0.5) == ['a', 'b']
+    baseline['relative'] = {'a': ['b', 1.0]}
+    assert compare({'a': 1.2, 'b': 1.5}, baseline, 0.5) == []
+    assert compare({'a': 1.2, 'b': 1.1}, baseline, 0.5) == ['a']
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(r'^parse\.short_word$', repeat=1)
+    assert list(results) == ['parse.short_word']
+    assert results['parse.short_word'] > 0
+
+
+def test_compare_engines():
+    report = compare_engines()
+    assert set(report) == {'rules', 'greedy', 'optimal'}
+    assert report['optimal']['unknown_rate'] < \
+        report['rules']['unknown_rate']
+    assert report['optimal']['tokens_per_word'] <= \
+        report['greedy']['tokens_per_word']
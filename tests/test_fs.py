@@ -0,0 +1,80 @@
+import pickle
+import pytest
+from phonesis.impl import Tokenizer
+from phonesis.fs import MappedVocab
+
+EN_CODEX = 'samples/en_phsis_built.json'
+
+
+def test_binary_codex(tmp_path):
+    model = Tokenizer()
+    model.load(EN_CODEX)
+    codex_path = str(tmp_path / 'en.phsx')
+    model.save(codex_path)
+
+    mapped = Tokenizer()
+    mapped.load(codex_path)
+    assert isinstance(mapped.vocab, MappedVocab)
+    assert mapped.consonants == model.consonants
+    assert mapped.vowels == model.vowels
+    assert list(mapped.vocab) == model.vocab
+    for index in (0, 1, 13621, len(model.vocab) - 1):
+        assert mapped.token_to_id(model.vocab[index]) == index
+    assert mapped.token_to_id('not-a-token') is None
+
+    text = "Computer Learning Entertenment fonctionnement Hardcore"
+    assert mapped.encode(text) == model.encode(text)
+
+    clone = pickle.loads(pickle.dumps(mapped))
+    assert isinstance(clone.vocab, MappedVocab)
+    assert clone.encode(text) == model.encode(text)
+
+    json_path = str(tmp_path / 'en.json')
+    mapped.save(json_path)
+    model.load(json_path)
+    assert model.vocab == list(mapped.vocab)
+
+
+def test_corrupted_binary_codex(tmp_path):
+    model = Tokenizer(['#', 'a', 'ba'])
+    codex_path = tmp_path / 'small.phsx'
+    model.save(str(codex_path))
+    data = bytearray(codex_path.read_bytes())
+    data[-1] ^= 0xff
+    codex_path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        Tokenizer().load(str(codex_path), verify=True)
+    # Without the checksum, only the sizes of the sections are checked.
+    codex_path.write_bytes(bytes(data[:-1]))
+    with pytest.raises(ValueError):
+        Tokenizer().load(str(codex_path))
+
+
+def test_delta_journal(tmp_path):
+    from phonesis.fs import append_delta, DELTA_SUFFIX
+    from phonesis.train import Trainer
+
+    codex_path = str(tmp_path / 'codex.json')
+    base = Tokenizer(['#', 'bon', 'jour'])
+    base.save(codex_path)
+
+    for binary in (False, True):
+        model = Tokenizer()
+        model.load(codex_path)
+        trainer = Trainer(["bonsoir", "journal"], model.consonants,
+                          model.vowels, list(model.vocab))
+        trainer.run()
+        append_delta(codex_path, trainer.new_tokens)
+
+        updated = Tokenizer()
+        updated.load(codex_path)
+        assert isinstance(updated.vocab, MappedVocab) == binary
+        assert updated.vocab[:3] == ['#', 'bon', 'jour']
+        assert list(updated.vocab) == trainer.vocab
+        assert updated.encode("bonsoir")[1] == [1, 4, 0]
+
+        updated.save(codex_path)
+        assert not (tmp_path / ('codex.json' + DELTA_SUFFIX)).exists()
+        if not binary:
+            codex_path = str(tmp_path / 'codex.phsx')
+            base.save(codex_path)
@@ -0,0 +1,51 @@
+import io
+import sys
+import json
+import pytest
+from phonesis.main import inference
+from phonesis.stream import encode_records
+from phonesis.impl import Tokenizer
+
+FR_CODEX = 'samples/fr_phsis_built.json'
+LINES = ["Verbalement", "", "Machine Learning", "Arnold boxes"]
+
+
+def test_encode_records():
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    expected = [model.encode(line) for line in LINES]
+    assert list(encode_records(model, LINES)) == expected
+    assert list(encode_records(model, LINES, workers=2, chunk_size=1)) == \
+        expected
+
+
+def run_inference(monkeypatch, capsys, *args):
+    monkeypatch.setattr(sys, 'argv', ['phonesis-inference', '-m', FR_CODEX,
+                                      *args])
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('\n'.join(LINES) + '\n'))
+    inference()
+    return capsys.readouterr()
+
+
+def test_bulk_inference(monkeypatch, capsys):
+    model = Tokenizer()
+    model.load(FR_CODEX)
+
+    out = run_inference(monkeypatch, capsys)
+    records = [json.loads(line) for line in out.out.splitlines()]
+    assert [r['text'] for r in records] == LINES
+    assert [r['ids'] for r in records] == \
+        [model.encode(line)[1] for line in LINES]
+    assert records[2]['unknowns'] == {'learning': 1}
+    assert "4 lines" in out.err and "1 lines with unknown" in out.err
+
+    out = run_inference(monkeypatch, capsys, '--on-unknown', 'skip',
+                        '--format', 'tsv')
+    rows = [line.split('\t') for line in out.out.splitlines()]
+    assert [row[0] for row in rows] == ["Verbalement", "", "Arnold boxes"]
+    assert rows[0][1] == "ver ba le men t #"
+
+    with pytest.raises(SystemExit):
+        run_inference(monkeypatch, capsys, '--on-unknown', 'raise')
+    out = capsys.readouterr()
+    assert "line 3" in out.err
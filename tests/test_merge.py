@@ -0,0 +1,61 @@
+import logging
+from phonesis.impl import Tokenizer
+from phonesis.merge import (merge_alphabets, merge_codexes, merge_vocabs,
+                            remap_ids, remap_stream, save_remap_table,
+                            load_remap_table, remap_table_path)
+from phonesis.stream import IdStreamReader, encode_file
+
+
+def test_merge_alphabets(caplog):
+    with caplog.at_level(logging.WARNING):
+        consonants, vowels = merge_alphabets(
+            [(['b', 'y'], ['a']), (['b', 'k'], ['y', 'e'])])
+    assert consonants == ['b', 'y', 'k']
+    assert vowels == ['a', 'e']
+    assert '"y" is kept as a consonant' in caplog.text
+
+
+def test_merge_vocabs():
+    vocab, remaps = merge_vocabs([['#', 'men', 'ter', 'a'],
+                                  ['#', 'ction', 'men', 'men']])
+    assert vocab == ['#', 'a', 'ction', 'men', 'ter']
+    assert list(remaps[0]) == [0, 3, 4, 1]
+    assert list(remaps[1]) == [0, 2, 3, 3]
+    assert list(remap_ids([3, -1, 0, 9], remaps[0], 5)) == [1, 5, 0, 5]
+
+
+def test_merge_codexes(tmp_path):
+    models = []
+    for file_path in ('samples/fr_phsis_built.json',
+                      'samples/en_phsis_built.json'):
+        model = Tokenizer()
+        model.load(file_path)
+        models.append(model)
+    merged, remaps = merge_codexes(models)
+    assert len(merged.vocab) == len(set(models[0].vocab) |
+                                    set(models[1].vocab))
+    for model, table in zip(models, remaps):
+        ids = model.encode("fonctionnement entertainment")[1]
+        assert [merged.vocab[i] for i in remap_ids(ids, table)] == \
+            [model.vocab[i] for i in ids]
+
+    table_path = str(tmp_path / 'fr.remap')
+    save_remap_table(table_path, remaps[0])
+    assert load_remap_table(table_path) == remaps[0]
+
+    text_file = tmp_path / 'corpus.txt'
+    text_file.write_text("Verbalement\nArnold boxes\n", encoding='utf-8')
+    encode_file(models[0], str(text_file), str(tmp_path / 'fr'))
+    assert remap_stream(str(tmp_path / 'fr'), str(tmp_path / 'merged'),
+                        remaps[0], len(merged.vocab)) == 2
+    with IdStreamReader(str(tmp_path / 'merged')) as reader:
+        assert [list(ids) for ids in reader] == \
+            [merged.encode(line)[1] for line in
+             ["Verbalement", "Arnold boxes"]]
+
+
+def test_remap_table_paths():
+    paths = [remap_table_path('out/multi.json', source, index)
+             for index, source in enumerate(['fr/codex.json',
+                                             'en/codex.json'])]
+    assert paths == ['out/multi.0.codex.remap', 'out/multi.1.codex.remap']
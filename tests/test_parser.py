@@ -0,0 +1,49 @@
+import json
+import itertools
+from phonesis.impl import Parser, CascadeParser, preprocess, split_pattern
+
+
+def test_same_tokens_as_cascade_on_all_patterns():
+    parse = Parser(['c'], ['v'])
+    reference = CascadeParser(['c'], ['v'])
+    for length in range(1, 11):
+        for letters in itertools.product('cv', repeat=length):
+            word = ''.join(letters)
+            assert parse(word) == reference(word), word
+
+
+def test_same_tokens_as_cascade_on_dictionary():
+    with open('samples/fr/alphabet.json', encoding='utf-8') as f:
+        alphabet = json.load(f)
+    consonants = alphabet['consonants']
+    vowels = alphabet['vowels']
+    parse = Parser(consonants, vowels)
+    reference = CascadeParser(consonants, vowels)
+
+    n_words = 0
+    with open('samples/fr/small_dico.txt', encoding='utf-8') as f:
+        for line in f:
+            for word in preprocess(line, consonants, vowels):
+                if not word:
+                    continue
+                assert parse(word) == reference(word), word
+                n_words += 1
+    assert n_words > 20000
+
+
+def test_unclassified_letters_terminate():
+    parse = Parser()
+    assert parse("été") == ['é', 't', 'é', '#']
+    assert parse.split_positions("été") == (1, 2, 3)
+    assert parse("") == ['#']
+
+
+def test_split_pattern_is_memoized():
+    parse = Parser(['b', 'n', 's', 'r'], ['o', 'i'])
+    split_pattern.cache_clear()
+    assert parse("bonsoir") == ['bon', 'soir', '#']
+    assert parse("bonbon") == ['bon', 'bon', '#']
+    # "bonsoir" and "sonbir" have the same consonant/vowel encoding.
+    assert parse("sonbir") == ['son', 'bir', '#']
+    info = split_pattern.cache_info()
+    assert (info.hits, info.misses) == (1, 2)
@@ -0,0 +1,38 @@
+import bz2
+import gzip
+import lzma
+import pytest
+from phonesis.reader import DictionaryReader
+
+CONTENT = "été\t12\tete\nabc 3\n\nété\t1\n  \ndéjà\t5\r\n"
+
+
+@pytest.mark.parametrize('module', [None, gzip, bz2, lzma])
+def test_read_dictionary(tmp_path, module):
+    file_path = tmp_path / 'dico.txt'
+    data = CONTENT.encode('utf-8')
+    if module:
+        data = module.compress(data)
+    file_path.write_bytes(data)
+
+    reports = []
+    reader = DictionaryReader(str(file_path), block_size=3,
+                              progress=lambda *a: reports.append(a))
+    assert list(reader) == ['été', 'abc', 'déjà']
+    assert reader.n_duplicates == 1
+    assert reports[-1] == (len(data), len(data))
+
+    reader = DictionaryReader(str(file_path), dedup=False, column=1)
+    assert list(reader) == ['12', '3', '1', '5']
+    reader = DictionaryReader(str(file_path), sep='\t', column=2)
+    assert list(reader) == ['ete']
+
+
+def test_read_byte_ranges(tmp_path):
+    file_path = tmp_path / 'dico.txt'
+    file_path.write_bytes(CONTENT.encode('utf-8'))
+    size = file_path.stat().st_size
+    for cut in range(size + 1):
+        words = list(DictionaryReader(str(file_path), dedup=False, end=cut))
+        words += DictionaryReader(str(file_path), dedup=False, start=cut)
+        assert words == ['été', 'abc', 'été', 'déjà']
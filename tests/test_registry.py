@@ -0,0 +1,54 @@
+from phonesis.impl import Tokenizer
+from phonesis.registry import CodexRegistry
+
+FR_CODEX = 'samples/fr_phsis_built.json'
+EN_CODEX = 'samples/en_phsis_built.json'
+
+
+def test_lazy_fallback(tmp_path):
+    fr = Tokenizer()
+    fr.load(FR_CODEX)
+    en = Tokenizer()
+    en.load(EN_CODEX)
+    en_path = str(tmp_path / 'en.phsx')
+    en.save(en_path)
+
+    registry = CodexRegistry([('fr', FR_CODEX), ('en', en_path)])
+    tokens, indexes, unknowns, routes = registry.encode("Verbalement")
+    assert registry.loaded == ['fr']
+    assert tokens == fr.encode("Verbalement")[0]
+    assert indexes == fr.encode("Verbalement")[1]
+    assert routes == ['fr']
+
+    tokens, indexes, unknowns, routes = registry.encode("Machine Learning")
+    assert registry.loaded == ['fr', 'en']
+    assert routes == ['fr', 'en']
+    offset = len(fr.vocab)
+    assert indexes[-4:] == [i + offset for i in en.encode("Learning")[1]]
+    assert unknowns == {}
+    assert registry.id_to_token(indexes[-4]) == ('en', 'lear')
+    assert len(registry) == len(fr.vocab) + len(en.vocab)
+
+
+def test_sizes_without_loading(tmp_path):
+    from phonesis.fs import append_delta
+
+    fr = Tokenizer()
+    fr.load(FR_CODEX)
+    codex_path = str(tmp_path / 'fr.json')
+    fr.save(codex_path)
+    append_delta(codex_path, ['zzz'])
+    registry = CodexRegistry([('fr', codex_path), ('en', EN_CODEX)])
+    assert registry.offset('en') == len(fr.vocab) + 1
+    assert len(registry) > registry.offset('en')
+    assert registry.loaded == []
+
+
+def test_shared_alphabet_tables():
+    registry = CodexRegistry({'fr': FR_CODEX, 'fr2': FR_CODEX})
+    first = registry.tokenizer('fr')
+    second = registry.tokenizer('fr2')
+    assert first is not second
+    assert first.normalize is second.normalize
+    assert first.parse is not second.parse
+    assert first.parse._classes is second.parse._classes
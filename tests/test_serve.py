@@ -0,0 +1,97 @@
+import asyncio
+import json
+import pytest
+from phonesis.impl import Tokenizer
+from phonesis.serve import TokenizerServer, TokenizerClient, ServerOverloaded
+
+FR_CODEX = 'samples/fr_phsis_built.json'
+TEXTS = ["Verbalement", "Arnold boxes", "Function", "Machine Learning"]
+
+
+def test_server_micro_batches():
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    expected = model.forward(TEXTS)
+
+    async def run():
+        server = TokenizerServer(model, max_batch=8, max_delay=0.05)
+        await server.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        client = await TokenizerClient().connect('127.0.0.1', port)
+        try:
+            results = await asyncio.gather(
+                *[client.encode([text]) for text in TEXTS])
+            stats = await client.stats()
+        finally:
+            await client.close()
+            await server.close()
+        return results, stats
+
+    results, stats = asyncio.run(run())
+    for (result,), (tokens, ids, unknowns) in zip(results, expected):
+        assert result['tokens'] == tokens
+        assert result['ids'] == ids
+    assert stats['requests'] == len(TEXTS)
+    assert stats['batches'] < len(TEXTS)
+    assert stats['p99_ms'] >= stats['p50_ms']
+
+
+def test_server_rejects_when_queue_is_full():
+    async def run():
+        server = TokenizerServer(Tokenizer(['#']), max_queue=1,
+                                 max_delay=0.2, max_batch=100)
+        first = asyncio.ensure_future(server.submit(["a"]))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(server.submit(["b"]))
+        await asyncio.sleep(0)
+        third = server.submit(["c"])
+        with pytest.raises(ServerOverloaded):
+            await third
+        await asyncio.gather(first, second)
+        await server.close()
+        return server.stats()
+
+    assert asyncio.run(run())['rejected'] == 1
+
+
+def test_server_isolates_failed_requests():
+    model = Tokenizer(on_unknown='raise')
+    model.load(FR_CODEX)
+
+    async def run():
+        server = TokenizerServer(model, max_batch=8, max_delay=0.05)
+        good = asyncio.ensure_future(server.submit(["Verbalement"]))
+        bad = asyncio.ensure_future(server.submit(["Machine Learning"]))
+        results = await asyncio.gather(good, bad, return_exceptions=True)
+        with pytest.raises(TypeError):
+            await server.submit([None])
+        await server.close()
+        return results, server.stats()
+
+    (good, bad), stats = asyncio.run(run())
+    assert good == model.forward(["Verbalement"])
+    assert isinstance(bad, Exception)
+    assert stats['batches'] == 1
+
+
+def test_server_replies_to_invalid_requests():
+    async def run():
+        server = TokenizerServer(Tokenizer(['#']))
+        await server.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        responses = []
+        try:
+            for line in (b'[1, 2]\n', b'"hi"\n', b'{oops\n'):
+                writer.write(line)
+                await writer.drain()
+                responses.append(json.loads(
+                    await asyncio.wait_for(reader.readline(), 5)))
+        finally:
+            writer.close()
+            await server.close()
+        return responses
+
+    for response in asyncio.run(run()):
+        assert response['id'] is None
+        assert response['error']
@@ -0,0 +1,67 @@
+import time
+from phonesis.impl import Tokenizer
+
+FR_CODEX = 'samples/fr_phsis_built.json'
+TEXT = "Verbalement Arnold boxes machine learning verbalement"
+
+
+def test_stage_stats():
+    model = Tokenizer(cache_size=16)
+    model.load(FR_CODEX)
+    expected = model.encode(TEXT)
+    model.clear_cache()
+
+    model.enable_stats()
+    assert model.encode(TEXT) == expected
+    stats = model.stats()
+    assert stats['texts'] == 1
+    assert stats['words'] == 6
+    assert stats['cache_hits'] == 1
+    assert stats['tokens'] == len(expected[1])
+    assert stats['unknown_tokens'] == expected[1].count(-1)
+    assert stats['stages']['preprocess']['calls'] == 1
+    assert stats['stages']['parse']['calls'] == 5
+    assert stats['stages']['lookup']['calls'] == 5
+    assert sum(stats['tokens_per_word'].values()) == 6
+    assert stats['word_length'][len("verbalement")] == 2
+
+    text = model.stats_prometheus()
+    assert 'phonesis_words_total 6' in text
+    assert 'phonesis_stage_calls_total{stage="parse"} 5' in text
+    assert 'phonesis_word_length_bucket{le="+Inf"} 6' in text
+
+    model.load(FR_CODEX)
+    model.encode("boxes")
+    assert model.stats()['words'] == 7
+
+    model.disable_stats()
+    assert model.stats() == {}
+    assert model.encode(TEXT) == expected
+
+
+def best_times(runs, number=200, repeat=15):
+    """
+    Best time of each function, measured alternately so they all
+    share the same conditions
+    """
+    best = [float('inf')] * len(runs)
+    for _ in range(repeat):
+        for i, run in enumerate(runs):
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+def test_disabled_stats_overhead():
+    plain = Tokenizer()
+    plain.load(FR_CODEX)
+    toggled = Tokenizer()
+    toggled.load(FR_CODEX)
+    toggled.enable_stats()
+    toggled.disable_stats()
+
+    reference, disabled = best_times([lambda: plain.encode(TEXT),
+                                      lambda: toggled.encode(TEXT)])
+    assert disabled < reference * 1.25
@@ -0,0 +1,34 @@
+import os
+from phonesis.impl import Tokenizer
+from phonesis.stream import (IdStreamReader, encode_file, encode_varints,
+                             decode_varints)
+
+FR_CODEX = 'samples/fr_phsis_built.json'
+
+
+def test_varints():
+    ids = [0, 1, 127, 128, 300, 65535, 70000]
+    assert list(decode_varints(encode_varints(ids))) == ids
+
+
+def test_encode_file(tmp_path):
+    text_file = tmp_path / 'corpus.txt'
+    text_file.write_text("Verbalement\n\nArnold boxes\nMachine Learning\n",
+                         encoding='utf-8')
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    expected = [model.encode(line)[1] for line in
+                ["Verbalement", "", "Arnold boxes", "Machine Learning"]]
+    unk_id = len(model.vocab)
+    expected = [[unk_id if i < 0 else i for i in ids] for ids in expected]
+
+    for varint in (False, True):
+        prefix = str(tmp_path / ('varint' if varint else 'fixed'))
+        n_docs, n_ids = encode_file(model, str(text_file), prefix, varint)
+        assert n_docs == 4
+        assert n_ids == sum(map(len, expected))
+        with IdStreamReader(prefix) as reader:
+            assert reader.unk_id == unk_id
+            assert [list(ids) for ids in reader] == expected
+        if not varint:
+            assert os.path.getsize(prefix + '.bin') == 2 * n_ids
@@ -0,0 +1,144 @@
+import pytest
+from phonesis.impl import Tokenizer
+from phonesis.train import Trainer
+from phonesis.exceptions import UnknownTokenError
+
+FR_CODEX = 'samples/fr_phsis_built.json'
+
+
+def test_index_matches_vocab_positions():
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    for index in (0, 1, 52, len(model.vocab) - 1):
+        token = model.vocab[index]
+        assert model.token_to_id(token) == index
+        assert model.id_to_token(index) == token
+
+    tokens, indexes, _ = model.encode("Verbalement")
+    assert tokens == ['ver', 'ba', 'le', 'men', 't', '#']
+    assert indexes == [model.vocab.index(t) for t in tokens]
+
+
+def test_index_follows_vocab_changes():
+    trainer = Trainer(["bonjour"], list('bcdfghjklmnpqrstvwxz'),
+                      list('aeiouy'))
+    model = trainer.get_model()
+    assert model.token_to_id('bon') is None
+
+    trainer.run()
+    assert model.token_to_id('bon') == model.vocab.index('bon')
+
+    model.vocab = ['#', 'bon', 'jour']
+    assert model.encode("bonjour")[1] == [1, 2, 0]
+
+    model = Tokenizer(['#', 'bon', 'soir'], cache_size=4)
+    assert model.encode("bonjour")[1] == [1, -1, 0]
+    model.vocab[2] = 'jour'
+    model.reindex()
+    assert model.token_to_id('soir') is None
+    assert model.id_to_token(2) == 'jour'
+    assert model.encode("bonjour")[1] == [1, 2, 0]
+
+
+def test_unknown_token():
+    model = Tokenizer(['#', 'bon'])
+    _, indexes, unknowns = model.encode("bonjour")
+    assert indexes == [1, -1, 0]
+    assert unknowns == {'bonjour': 0}
+
+    model.raises_except = True
+    with pytest.raises(UnknownTokenError):
+        model.encode("bonjour")
+
+
+def test_word_cache():
+    model = Tokenizer(cache_size=2)
+    model.load(FR_CODEX)
+    expected = model.encode("verbalement verbalement")
+    assert model.cache_stats()['hits'] == 1
+    assert model.cache_stats()['misses'] == 1
+
+    model.encode("boxes arnold verbalement")
+    stats = model.cache_stats()
+    assert stats['size'] == 2
+    assert stats['evictions'] == 2
+    assert model.encode("verbalement verbalement") == expected
+
+    model.load(FR_CODEX)
+    assert model.cache_stats()['size'] == 0
+
+
+def test_encode_batch_keeps_order():
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    texts = ["Verbalement", "Arnold", "Boxes", "Function", "Machine"] * 3
+    expected = model.forward(texts)
+    assert model.encode_batch(texts, workers=2, chunk_size=4) == expected
+    assert model.encode_batch(texts[:2], workers=2) == expected[:2]
+
+
+def test_normalization():
+    from phonesis.impl import Normalizer, preprocess
+    normalize = Normalizer(list('bcdfghjklmnpqrstvwxz'), list('aeiouyé'))
+    assert normalize("Été\tself-contained,\nLÉGER") == \
+        ['été', 'selfcontained', 'léger']
+    assert normalize("E\u0301te\u0301") == ['été']
+    assert normalize("  ") == []
+    assert preprocess("Été", ['t'], ['é']) == ['été']
+
+
+def test_decode():
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    ids = model.encode("Verbalement  Arnold")[1]
+    assert model.decode(ids) == "verbalement arnold"
+    assert model.decode_words(ids) == ["verbalement", "arnold"]
+    pad_id = len(model.vocab)
+    assert model.decode(ids + [pad_id] * 3, pad_id=pad_id) == \
+        "verbalement arnold"
+    # The vocab size is the unknown id of the id streams, only skipped
+    # when it is the padding.
+    assert model.decode(ids + [pad_id]) == "verbalement arnold ?"
+    assert model.decode(ids + [-2], pad_id=-2) == "verbalement arnold"
+    assert model.decode_batch([ids, [], [0, 0]]) == \
+        ["verbalement arnold", "", ""]
+
+    model = Tokenizer(['#', 'bon'])
+    ids = model.encode("bonjour bon")[1]
+    assert ids == [1, -1, 0, 1, 0]
+    assert model.decode(ids) == "bon? bon"
+    assert model.decode(ids, on_unknown='skip') == "bon bon"
+    with pytest.raises(UnknownTokenError):
+        model.decode(ids, on_unknown='raise')
+
+
+def test_encode_spans():
+    model = Tokenizer()
+    model.load(FR_CODEX)
+    for text in ["Verbalement, Arnold!", "L'ÉTÉ  straße e\u0301te\u0301", ""]:
+        spans = model.encode_spans(text)
+        tokens, indexes, _ = model.encode(text)
+        assert list(spans.ids) == indexes
+        assert len(spans.starts) == len(spans.ends) == len(indexes)
+        pieces = [text[s:e] for s, e in zip(spans.starts, spans.ends)]
+        assert [p for p, t in zip(pieces, tokens) if t == '#'] == \
+            [''] * tokens.count('#')
+
+    text = "Verbalement, Arnold!"
+    spans = model.encode_spans(text, boundaries=False)
+    assert [text[s:e] for s, e in zip(spans.starts, spans.ends)] == \
+        ['Ver', 'ba', 'le', 'men', 't', 'Ar', 'nol', 'd']
+
+    # The removed characters inside a token and the decomposed
+    # letters are in its span.
+    text = "L'ÉTÉ e\u0301te\u0301"
+    spans = model.encode_spans(text, boundaries=False)
+    assert [text[s:e] for s, e in zip(spans.starts, spans.ends)] == \
+        ["L'É", "TÉ", "e\u0301", "te\u0301"]
+
+    # The words are encoded one by one with the cache or the statistics.
+    model = Tokenizer(cache_size=16)
+    model.load(FR_CODEX)
+    model.enable_stats()
+    text = "Verbalement, Arnold! L'ÉTÉ e\u0301te\u0301"
+    assert list(model.encode_spans(text).ids) == model.encode(text)[1]
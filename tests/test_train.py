@@ -0,0 +1,172 @@
+from phonesis.constants import DEFAULT_CONS, DEFAULT_VOWS
+from phonesis.train import Trainer
+
+WORDS = ["bonjour", "Bonsoir", "journal", "abc", "", "soir bon"]
+
+
+def legacy_vocab(words, vocab):
+    trainer = Trainer([], DEFAULT_CONS, DEFAULT_VOWS)
+    new_tokens = []
+    for word in words:
+        for token in trainer.parse(word.lower()) if word else []:
+            if token not in vocab and token not in new_tokens:
+                new_tokens.append(token)
+    return vocab + sorted(new_tokens)
+
+
+def test_vocab_order_and_counts():
+    words = [w for s in WORDS for w in s.split()]
+    trainer = Trainer(WORDS, DEFAULT_CONS, DEFAULT_VOWS, vocab=['soir', 'z'])
+    n_new = trainer.run()
+    assert trainer.vocab == legacy_vocab(words, ['soir', 'z'])
+    assert n_new == len(trainer.vocab) - 2
+    assert trainer.n_words == len(words)
+    assert trainer.counts['#'] == len(words)
+    assert trainer.counts['bon'] == 3
+    assert trainer.n_tokens == sum(trainer.counts.values())
+
+
+def test_sharded_training_same_vocab():
+    import json
+    from phonesis.train import ShardedTrainer, shard_ranges
+    from phonesis.reader import DictionaryReader
+
+    dico = 'samples/fr/small_dico.txt'
+    with open('samples/fr/alphabet.json', encoding='utf-8') as f:
+        alphabet = json.load(f)
+    with open(dico, encoding='utf-8') as f:
+        words = [line.split()[0] for line in f if line.split()]
+
+    shards = shard_ranges(dico, 7)
+    assert [w for start, end in shards for w in DictionaryReader(
+        dico, dedup=False, start=start, end=end)] == words
+
+    trainer = Trainer(words, alphabet['consonants'], alphabet['vowels'])
+    trainer.run()
+    sharded = ShardedTrainer(dico, alphabet['consonants'],
+                             alphabet['vowels'], workers=3,
+                             reader_options=dict(dedup=False))
+    sharded.run()
+    assert sharded.vocab == trainer.vocab
+    assert sharded.counts == trainer.counts
+    assert sharded.n_words == trainer.n_words
+
+
+def test_sharded_training_compressed(tmp_path):
+    import gzip
+    from phonesis.train import ShardedTrainer
+
+    dico = tmp_path / 'dico.txt.gz'
+    with gzip.open(dico, mode='wt', encoding='utf-8') as f:
+        f.write("bonjour\nbonsoir\njournal\n" * 3)
+    trainer = Trainer(["bonjour", "bonsoir", "journal"], DEFAULT_CONS,
+                      DEFAULT_VOWS)
+    trainer.run()
+    sharded = ShardedTrainer(str(dico), DEFAULT_CONS, DEFAULT_VOWS,
+                             workers=2)
+    sharded.run()
+    assert sharded.vocab == trainer.vocab
+    assert sharded.n_words == 3
+
+
+def test_sharded_training_global_dedup(tmp_path):
+    import json
+    from phonesis.train import ShardedTrainer
+    from phonesis.reader import DictionaryReader
+
+    with open('samples/fr/alphabet.json', encoding='utf-8') as f:
+        alphabet = json.load(f)
+    with open('samples/fr/small_dico.txt', encoding='utf-8') as f:
+        text = f.read()
+    # The duplicates are in the other shard, and in another file.
+    dico = tmp_path / 'dico.txt'
+    dico.write_text(text + text, encoding='utf-8')
+    other = tmp_path / 'other.txt'
+    other.write_text(text, encoding='utf-8')
+    files = [str(dico), str(other)]
+
+    seen = set()
+    words = [word for file_path in files
+             for word in DictionaryReader(file_path, seen=seen)]
+    assert len(words) == len(set(words))
+    trainer = Trainer(words, alphabet['consonants'], alphabet['vowels'],
+                      min_count=3)
+    trainer.run()
+    for workers in (1, 2, 3):
+        sharded = ShardedTrainer(files, alphabet['consonants'],
+                                 alphabet['vowels'], workers=workers,
+                                 min_count=3)
+        sharded.run()
+        assert sharded.counts == trainer.counts
+        assert sharded.vocab == trainer.vocab
+        assert sharded.n_words == len(words)
+
+
+def test_vocab_budget_and_remap():
+    words = ["bonjour", "bonsoir", "bonbon", "journal", "soir"]
+    old_vocab = ['#', 'bon', 'jour', 'nal', 'soir', 'xyz']
+    trainer = Trainer(words, DEFAULT_CONS, DEFAULT_VOWS, vocab=old_vocab,
+                      min_count=2, order='frequency')
+    trainer.run()
+    vocab = trainer.vocab
+    letters = set(DEFAULT_CONS) | set(DEFAULT_VOWS)
+    assert letters < set(vocab)
+    assert vocab[:4] == ['#', 'bon', 'jour', 'soir']
+    assert 'jour' in vocab and 'nal' not in vocab
+    assert trainer.n_pruned == 1
+    assert trainer.new_tokens == [t for t in vocab if t not in old_vocab]
+
+    remap = trainer.remap
+    assert [vocab[i] for i in remap[1]] == ['bon']
+    assert ''.join(vocab[i] for i in remap[3]) == 'nal'
+    assert ''.join(vocab[i] for i in remap[5]) == 'xyz'
+
+    # The pruned tokens are decomposed by the tokenizer.
+    model = trainer.get_model()
+    assert -1 in model.encode("journal")[1]
+    model.on_unknown = 'decompose'
+    tokens, indexes, unknowns = model.encode("journal")
+    assert ''.join(tokens) == 'journal#'
+    assert -1 not in indexes and unknowns == {}
+
+    trainer = Trainer(words, DEFAULT_CONS, DEFAULT_VOWS,
+                      max_vocab=len(letters) + 2)
+    trainer.run()
+    assert set(trainer.vocab) == letters | {'#', 'bon'}
+
+
+def test_external_training_same_codex(tmp_path):
+    import json
+    from phonesis.train import ExternalTrainer
+
+    with open('samples/fr/alphabet.json', encoding='utf-8') as f:
+        alphabet = json.load(f)
+    with open('samples/fr/small_dico.txt', encoding='utf-8') as f:
+        words = [line.split()[0] for line in f if line.split()]
+    consonants, vowels = alphabet['consonants'], alphabet['vowels']
+
+    trainer = Trainer(words, consonants, vowels, vocab=['soir', 'z'])
+    trainer.run()
+    expected = tmp_path / 'expected.json'
+    trainer.get_model().save(str(expected))
+
+    output = tmp_path / 'codex.json'
+    trainer = ExternalTrainer(words, consonants, vowels, str(output),
+                              vocab=['soir', 'z'], memory_limit=20000,
+                              tmp_dir=str(tmp_path))
+    trainer.MAX_OPEN_RUNS = 4
+    n_new = trainer.run()
+    assert trainer.n_runs > 4
+    assert output.read_text() == expected.read_text()
+    assert n_new == len(json.loads(expected.read_text())['vocab']) - 2
+    assert list(tmp_path.iterdir()) != [] and \
+        not any(p.name.startswith('phonesis-runs-')
+                for p in tmp_path.iterdir())
+
+    trainer = ExternalTrainer(words, consonants, vowels, str(output),
+                              memory_limit=20000, min_count=50)
+    trainer.run()
+    vocab = json.loads(output.read_text())['vocab']
+    counts = Trainer(words, consonants, vowels)
+    counts.count(words)
+    assert vocab == sorted(t for t, c in counts.counts.items() if c >= 50)
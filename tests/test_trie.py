@@ -0,0 +1,45 @@
+import pickle
+from phonesis.impl import Tokenizer
+from phonesis.trie import TrieParser
+
+VOCAB = ['#', 'a', 'ab', 'abc', 'bcd', 'c', 'd', 'e']
+
+
+def test_greedy_and_optimal():
+    greedy = TrieParser(VOCAB, 'greedy')
+    optimal = TrieParser(VOCAB, 'optimal')
+    assert greedy("abcd") == ['abc', 'd', '#']
+    assert optimal("abcd") == ['abc', 'd', '#']
+    # The greedy match of "abc" leaves "de", which needs two tokens.
+    assert greedy("abcde") == ['abc', 'd', 'e', '#']
+    assert optimal("abcde") == ['abc', 'd', 'e', '#']
+    assert greedy("abxd") == ['ab', 'x', 'd', '#']
+    assert optimal("abxd") == ['ab', 'x', 'd', '#']
+    assert greedy("") == ['#']
+
+
+def test_optimal_uses_fewer_tokens():
+    vocab = ['#', 'a', 'ab', 'b', 'bcdef', 'c', 'd', 'e', 'f']
+    assert TrieParser(vocab, 'greedy')("abcdef") == \
+        ['ab', 'c', 'd', 'e', 'f', '#']
+    assert TrieParser(vocab, 'optimal')("abcdef") == ['a', 'bcdef', '#']
+
+
+def test_tokenizer_engine():
+    model = Tokenizer()
+    model.load('samples/fr_phsis_built.json')
+    assert -1 in model.encode("Machine Learning")[1]
+
+    model.engine = 'optimal'
+    tokens, indexes, unknowns = model.encode("Machine Learning")
+    assert -1 not in indexes
+    assert unknowns == {}
+    assert ''.join(tokens) == "machine#learning#"
+    assert all(model.token_to_id(t) is not None for t in tokens)
+
+    clone = pickle.loads(pickle.dumps(model))
+    assert clone.engine == 'optimal'
+    assert clone.encode("Machine Learning")[1] == indexes
+
+    model.vocab = ['#', 'lear', 'ning']
+    assert model.encode("learning")[1] == [1, 2, 0]